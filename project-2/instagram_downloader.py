@@ -13,12 +13,203 @@ This script uses instaloader, which handles:
 import instaloader
 import os
 import sys
+import math
 import time
-import shutil
+from datetime import timezone
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
+from file_download import write_response
+from session_store import SessionStore
 
-def download_instagram_images(username, output_dir=None, login_username=None, login_password=None):
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+
+# Per-profile sync state (instaloader's --latest-stamps format), stored in the output directory
+LATEST_STAMPS_FILE = ".latest_stamps.ini"
+
+# Instagram's profile feed returns this many posts per GraphQL request
+POSTS_PER_PAGE = 12
+
+# Up to this many posts at the top of a profile may be pinned, whatever their age
+# (the same allowance instaloader's own --latest-stamps/--fast-update loop makes)
+POSSIBLY_PINNED = 3
+
+# Leading bytes of each supported image format (WebP also has "WEBP" at offset 8)
+IMAGE_SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'RIFF')
+
+
+def scan_images(directory: Path):
+    """List the image files in a directory with a single scandir pass."""
+    with os.scandir(directory) as entries:
+        return [
+            entry.path for entry in entries
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS
+        ]
+
+
+def verify_image(path):
+    """Check that a file is non-empty and starts with a known image signature."""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(12)
+    except OSError:
+        return False
+    if header.startswith(b'RIFF'):
+        return header[8:12] == b'WEBP'
+    return header.startswith(IMAGE_SIGNATURES)
+
+
+def make_thumbnail(path, thumbnail_dir, size):
+    """Write a JPEG thumbnail for one image, skipping it if already up to date (runs in a worker process)."""
+    from PIL import Image
+    
+    target = os.path.join(thumbnail_dir, os.path.splitext(os.path.basename(path))[0] + '.jpg')
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+        return False
+    with Image.open(path) as img:
+        img.draft('RGB', (size, size))  # Fast JPEG decode at reduced scale
+        img.thumbnail((size, size))
+        img.convert('RGB').save(target, 'JPEG', quality=85)
+    return True
+
+
+def post_process_images(output_path: Path, thumbnail_size=None, workers=None):
+    """
+    Verify and count downloaded images, optionally creating thumbnails.
+    
+    The directory is listed once; verification runs in a thread pool and
+    thumbnailing (CPU-bound) in a process pool.
+    
+    Args:
+        output_path: Directory containing the downloaded images
+        thumbnail_size: Max edge in pixels for thumbnails (written to output_path/thumbnails), or None
+        workers: Worker count for both pools (default: CPU count)
+    
+    Returns:
+        Dict with 'total', 'valid', 'invalid' (list of paths) and 'thumbnails' counts
+    """
+    workers = workers or os.cpu_count() or 4
+    paths = scan_images(output_path)
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        checks = list(pool.map(verify_image, paths))
+    valid = [path for path, ok in zip(paths, checks) if ok]
+    invalid = [path for path, ok in zip(paths, checks) if not ok]
+    
+    thumbnails = 0
+    if thumbnail_size and valid:
+        try:
+            import PIL  # noqa: F401 - only needed for thumbnails
+        except ImportError:
+            print("⚠️  Pillow is not installed; skipping thumbnails (pip install Pillow)")
+        else:
+            thumbnail_dir = output_path / "thumbnails"
+            thumbnail_dir.mkdir(exist_ok=True)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(make_thumbnail, path, str(thumbnail_dir), thumbnail_size) for path in valid]
+                for future in futures:
+                    try:
+                        thumbnails += bool(future.result())
+                    except Exception as e:
+                        print(f"⚠️  Thumbnail failed: {e}")
+    
+    return {'total': len(paths), 'valid': len(valid), 'invalid': invalid, 'thumbnails': thumbnails}
+
+
+def use_shared_writer(loader):
+    """
+    Route instaloader's image writes through file_download.write_response.
+    
+    Instaloader already writes via a temp file, but copies with small buffers and
+    never checks Content-Length; a truncated body raises DownloadError, which
+    instaloader's connection-error handling retries.
+    """
+    context = loader.context
+    default_write_raw = context.write_raw
+    
+    def write_raw(resp, filename):
+        if isinstance(resp, bytes):
+            default_write_raw(resp, filename)
+        else:
+            context.log(filename, end=' ', flush=True)
+            write_response(resp, filename)
+    
+    context.write_raw = write_raw
+
+
+def sync_profile(loader, profile, output_path: Path):
+    """
+    Download only posts newer than the last archived one.
+    
+    The newest archived post's timestamp is kept with instaloader.LatestStamps
+    (the same file format as instaloader's --latest-stamps option). Posts are
+    listed newest first, so iteration stops at the first post at or before
+    that timestamp. Pinned posts are shown first regardless of age, and
+    instaloader can't reliably tell which ones are pinned, so old posts among
+    the first POSSIBLY_PINNED are skipped rather than treated as the stopping
+    point.
+    
+    Each post is downloaded inside the context's error_catcher(), so a failing
+    post is logged and the sync continues. The timestamp is only advanced to
+    the newest downloaded post that is older than every failed one, so failed
+    posts are tried again on the next sync; if the listing itself fails, it
+    isn't advanced.
+    
+    Returns:
+        Dict with 'checked', 'downloaded', 'failed', 'requests_used' and 'requests_saved'
+    """
+    stamps = instaloader.LatestStamps(str(output_path / LATEST_STAMPS_FILE))
+    last_seen = stamps.get_last_post_timestamp(profile.username)
+    if last_seen.timestamp() > 0:
+        print(f"🔄 Incremental sync: fetching posts newer than {last_seen.isoformat()}")
+    else:
+        print("🔄 No sync state yet: doing a full crawl and recording the newest post")
+    
+    # Timestamps of the posts downloaded, and of the oldest one that failed
+    # (pinned posts come first, so these are not in order)
+    succeeded_times = []
+    oldest_failure = None
+    checked = 0
+    downloaded = 0
+    failed = 0
+    for post in profile.get_posts():
+        checked += 1
+        post_time = post.date_utc.replace(tzinfo=timezone.utc)
+        if post_time <= last_seen:
+            if checked <= POSSIBLY_PINNED:
+                continue
+            break
+        
+        succeeded = False
+        with loader.context.error_catcher(f"Download {post.shortcode}"):
+            if loader.download_post(post, target=profile.username):
+                downloaded += 1
+            succeeded = True
+        if succeeded:
+            succeeded_times.append(post_time)
+        else:
+            failed += 1
+            oldest_failure = min(oldest_failure or post_time, post_time)
+    
+    archived_until = max((t for t in succeeded_times if oldest_failure is None or t < oldest_failure),
+                         default=None)
+    if archived_until is not None and archived_until > last_seen:
+        stamps.set_last_post_timestamp(profile.username, archived_until)
+    
+    # One feed request per page of posts (estimate; media downloads are not counted)
+    requests_used = math.ceil(checked / POSTS_PER_PAGE)
+    requests_full = math.ceil(profile.mediacount / POSTS_PER_PAGE)
+    return {
+        'checked': checked,
+        'downloaded': downloaded,
+        'failed': failed,
+        'requests_used': requests_used,
+        'requests_saved': max(0, requests_full - requests_used),
+    }
+
+
+def download_instagram_images(username, output_dir=None, login_username=None, login_password=None,
+                              thumbnail_size=None, incremental=False):
     """
     Download all images from a public Instagram account.
     
@@ -26,7 +217,9 @@ def download_instagram_images(username, output_dir=None, login_username=None, lo
         username: Instagram username (without @)
         output_dir: Directory to save images (default: ./instagram_downloads/{username})
         login_username: Optional Instagram username for login (reduces rate limiting)
-        login_password: Optional Instagram password for login
+        login_password: Optional Instagram password for login (not needed if a saved session is still valid)
+        thumbnail_size: Optional max edge (pixels) for thumbnails created after download
+        incremental: Only fetch posts newer than the last sync (state kept in output_dir)
     """
     # Set up output directory
     if output_dir is None:
@@ -39,9 +232,11 @@ def download_instagram_images(username, output_dir=None, login_username=None, lo
     print(f"💾 Saving to: {output_path.absolute()}")
     
     # Create Instaloader instance
-    # Note: Instaloader will save to ./{username}/ by default
-    # We'll move files to output_path after download
+    # Instaloader writes straight into output_path (braces escaped for its format pattern),
+    # so no files need to be relocated afterwards
     loader = instaloader.Instaloader(
+        dirname_pattern=str(output_path).replace('{', '{{').replace('}', '}}'),
+        filename_pattern="{date_utc}_UTC",
         download_videos=False,  # Only download images
         download_video_thumbnails=False,
         download_geotags=False,
@@ -53,14 +248,23 @@ def download_instagram_images(username, output_dir=None, login_username=None, lo
         max_connection_attempts=3,
         request_timeout=30.0,
     )
+    use_shared_writer(loader)
     
     # Optional: Login to reduce rate limiting
     # Note: Login is optional but recommended for better rate limits
-    if login_username and login_password:
+    # A saved session is reused when still valid, so we don't log in on every run
+    session_store = SessionStore()
+    logged_in = False
+    if login_username and session_store.load_instaloader_session(loader, login_username):
+        print(f"🔐 Reusing saved session for @{login_username}")
+        logged_in = True
+    elif login_username and login_password:
         try:
             print(f"🔐 Logging in as @{login_username}...")
             loader.login(login_username, login_password)
+            logged_in = True
             print("✅ Login successful!")
+            session_store.save_instaloader_session(loader, login_username)
         except instaloader.exceptions.BadCredentialsException:
             print("❌ Login failed: Invalid credentials. Continuing without login...")
         except instaloader.exceptions.TwoFactorAuthRequiredException:
@@ -69,6 +273,9 @@ def download_instagram_images(username, output_dir=None, login_username=None, lo
             sys.exit(1)
         except Exception as e:
             print(f"⚠️  Login error: {e}. Continuing without login...")
+    elif login_username:
+        print(f"⚠️  No valid saved session for @{login_username}. Use --login USERNAME PASSWORD to log in again.")
+        print("ℹ️  Running without login (may have stricter rate limits)")
     else:
         print("ℹ️  Running without login (may have stricter rate limits)")
     
@@ -77,54 +284,39 @@ def download_instagram_images(username, output_dir=None, login_username=None, lo
         print(f"🔍 Fetching profile @{username}...")
         profile = instaloader.Profile.from_username(loader.context, username)
         
-        if not profile.is_private or (login_username and login_password):
+        if not profile.is_private or logged_in:
             print(f"✅ Found profile: {profile.full_name or username}")
             print(f"📊 Posts: {profile.mediacount}")
             
             # Download posts
             print("\n📥 Starting download...")
-            loader.download_profile(username, profile_pic=False, download_stories=False)
-            
-            # Move files from instaloader's default directory to our output directory
-            # Instaloader saves to ./{username}/ by default
-            default_dir = Path(username)
-            if default_dir.exists() and default_dir.is_dir():
-                # Move all image files
-                moved_count = 0
-                for file in default_dir.iterdir():
-                    if file.is_file():
-                        # Only move image files
-                        if file.suffix.lower() in ['.jpg', '.jpeg', '.png', '.webp']:
-                            dest = output_path / file.name
-                            if not dest.exists():
-                                shutil.move(str(file), str(dest))
-                                moved_count += 1
-                            else:
-                                file.unlink()  # Remove duplicate
-                
-                # Try to remove the directory if empty
-                try:
-                    if not any(default_dir.iterdir()):
-                        default_dir.rmdir()
-                except:
-                    pass
-                
-                if moved_count > 0:
-                    print(f"📦 Moved {moved_count} images to output directory")
+            if incremental:
+                sync = sync_profile(loader, profile, output_path)
+                print(f"📥 New posts downloaded: {sync['downloaded']} (checked {sync['checked']})")
+                if sync['failed']:
+                    print(f"⚠️  {sync['failed']} posts failed and will be retried on the next --update")
+                print(f"📉 Feed requests: {sync['requests_used']} used, ~{sync['requests_saved']} saved vs. a full crawl")
+            else:
+                loader.download_profile(username, profile_pic=False, download_stories=False)
             
             print(f"\n✅ Download complete! Images saved to: {output_path.absolute()}")
             
-            # Count downloaded images
-            image_count = len(list(output_path.glob("*.jpg"))) + \
-                         len(list(output_path.glob("*.jpeg"))) + \
-                         len(list(output_path.glob("*.png"))) + \
-                         len(list(output_path.glob("*.webp")))
-            print(f"📸 Total images downloaded: {image_count}")
-            
+            # Verify and count downloaded images in one directory pass
+            started = time.time()
+            result = post_process_images(output_path, thumbnail_size=thumbnail_size)
+            print(f"📸 Total images downloaded: {result['valid']}")
+            if result['invalid']:
+                print(f"⚠️  {len(result['invalid'])} files are empty or not valid images:")
+                for path in result['invalid'][:10]:
+                    print(f"   {path}")
+            if thumbnail_size:
+                print(f"🖼️  Created {result['thumbnails']} thumbnails in {output_path / 'thumbnails'}")
+            print(f"⏱️  Post-processing took {time.time() - started:.1f}s")
+        
         else:
             print(f"❌ Profile @{username} is private. Cannot download without login.")
             sys.exit(1)
-            
+    
     except instaloader.exceptions.ProfileNotExistsException:
         print(f"❌ Profile @{username} does not exist.")
         sys.exit(1)
@@ -144,11 +336,14 @@ def download_instagram_images(username, output_dir=None, login_username=None, lo
 def main():
     """Main function to handle command line arguments."""
     if len(sys.argv) < 2:
-        print("Usage: python instagram_downloader.py <username> [output_dir] [--login username password]")
+        print("Usage: python instagram_downloader.py <username> [output_dir] [--login username password | --session username] [--thumbnails SIZE] [--update]")
         print("\nExample:")
         print("  python instagram_downloader.py grapeot")
         print("  python instagram_downloader.py grapeot ./my_images")
         print("  python instagram_downloader.py grapeot --login my_username my_password")
+        print("  python instagram_downloader.py grapeot --session my_username   # reuse the saved login")
+        print("  python instagram_downloader.py grapeot --thumbnails 320")
+        print("  python instagram_downloader.py grapeot --update   # only fetch posts since the last run")
         sys.exit(1)
     
     username = sys.argv[1].replace('@', '').replace('https://www.instagram.com/', '').rstrip('/')
@@ -156,6 +351,8 @@ def main():
     output_dir = None
     login_username = None
     login_password = None
+    thumbnail_size = None
+    incremental = '--update' in sys.argv
     
     # Parse arguments
     i = 2
@@ -164,13 +361,21 @@ def main():
             login_username = sys.argv[i + 1]
             login_password = sys.argv[i + 2]
             i += 3
+        elif sys.argv[i] == '--session' and i + 1 < len(sys.argv):
+            login_username = sys.argv[i + 1]
+            i += 2
+        elif sys.argv[i] == '--thumbnails' and i + 1 < len(sys.argv):
+            thumbnail_size = int(sys.argv[i + 1])
+            i += 2
+        elif sys.argv[i] == '--update':
+            i += 1
         elif output_dir is None:
             output_dir = sys.argv[i]
             i += 1
         else:
             i += 1
     
-    download_instagram_images(username, output_dir, login_username, login_password)
+    download_instagram_images(username, output_dir, login_username, login_password, thumbnail_size, incremental)
 
 
 if __name__ == "__main__":
@@ -21,19 +21,271 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 import time
+import queue
+import threading
 import requests
-import re
 from pathlib import Path
 import json
 import sys
-from urllib.parse import urlparse
-from typing import Set, List
+from collections import deque
+from typing import Set, List, Dict
+
+from file_download import download_file
+from session_store import SessionStore
+from url_classifier import normalize_image_urls, image_extension
+
+
+# Collects every candidate image URL on the page (img src/srcset/data-src and
+# inline background-image styles) in one pass. Filtering happens in Python.
+COLLECT_CANDIDATES_FN = r"""
+function () {
+    const urls = [];
+    const push = value => { if (value) urls.push(value); };
+    const pushSrcset = value => {
+        if (!value) return;
+        for (const part of value.split(',')) {
+            push(part.trim().split(/\s+/)[0]);
+        }
+    };
+    for (const img of document.getElementsByTagName('img')) {
+        push(img.getAttribute('src'));
+        push(img.getAttribute('data-src'));
+        pushSrcset(img.getAttribute('srcset'));
+        pushSrcset(img.getAttribute('data-srcset'));
+    }
+    const bgPattern = /url\(["']?([^"')]+)["']?\)/g;
+    for (const el of document.querySelectorAll('[style*="url("]')) {
+        const style = el.getAttribute('style');
+        let match;
+        while ((match = bgPattern.exec(style)) !== null) push(match[1]);
+    }
+    return urls;
+}
+"""
+
+# Full (non-incremental) extraction in a single round trip
+COLLECT_ALL_CANDIDATES_JS = "return (" + COLLECT_CANDIDATES_FN + ")();"
+
+# Installed once per page: records DOM mutations and finished resource loads so
+# scroll steps can wait for the page to go quiet instead of sleeping blindly.
+SCROLL_OBSERVER_JS = """
+if (!window.__igScroll) {
+    const state = {mutations: 0, resources: 0, lastActivity: performance.now()};
+    new MutationObserver(records => {
+        state.mutations += records.length;
+        state.lastActivity = performance.now();
+    }).observe(document.body, {childList: true, subtree: true});
+    if (window.PerformanceObserver) {
+        new PerformanceObserver(list => {
+            state.resources += list.getEntries().length;
+            state.lastActivity = performance.now();
+        }).observe({type: 'resource', buffered: false});
+    }
+    window.__igScroll = state;
+}
+if (!window.__igHarvest) {
+    // Remembers what was already returned so each call only yields new URLs;
+    // this keeps posts that the virtualized grid later removes from the DOM.
+    const seen = new Set();
+    const collect = (""" + COLLECT_CANDIDATES_FN + """);
+    window.__igHarvest = () => collect().filter(url => !seen.has(url) && seen.add(url));
+}
+"""
+
+# Batched page state (one round trip instead of one per property)
+SCROLL_STATE_JS = """
+return {
+    height: document.body.scrollHeight,
+    offset: window.pageYOffset,
+    viewport: window.innerHeight,
+    articles: document.getElementsByTagName('article').length
+};
+"""
+
+# Scroll once, then resolve when the page has been quiet for idleMs after any
+# activity, when nothing happened at all within idleMs * 2, or at timeoutMs.
+# Activity only ends this wait: background beacons and playing videos keep it
+# above zero, so it says nothing about whether new posts loaded.
+# The result also carries the image URLs that appeared since the last call.
+SCROLL_STEP_JS = """
+const [mode, idleMs, timeoutMs] = arguments;
+const done = arguments[arguments.length - 1];
+const s = window.__igScroll;
+const before = s.mutations + s.resources;
+const start = performance.now();
+
+if (mode === 'bottom') {
+    window.scrollTo(0, document.body.scrollHeight);
+} else if (mode === 'rewind') {
+    window.scrollTo(0, document.body.scrollHeight * 0.7);
+} else {
+    window.scrollBy(0, Math.floor(window.innerHeight * 0.8));
+}
+
+(function check() {
+    const now = performance.now();
+    const activity = s.mutations + s.resources - before;
+    const quiet = now - Math.max(s.lastActivity, start) >= idleMs;
+    if ((activity > 0 && quiet) || (activity === 0 && now - start >= idleMs * 2) || now - start >= timeoutMs) {
+        done({
+            height: document.body.scrollHeight,
+            offset: window.pageYOffset,
+            viewport: window.innerHeight,
+            articles: document.getElementsByTagName('article').length,
+            activity: activity,
+            urls: window.__igHarvest ? window.__igHarvest() : []
+        });
+    } else {
+        setTimeout(check, 50);
+    }
+})();
+"""
+
+
+# Resources a profile scroll never uses: video, fonts and analytics/logging beacons.
+# Images are left alone so lazy loading, layout and network capture keep working.
+BLOCKED_URL_PATTERNS = [
+    '*.mp4*', '*.m4v*', '*.webm*', '*.m3u8*',
+    '*.woff*', '*.ttf*', '*.otf*',
+    '*/logging_client_events*', '*/ajax/bz*', '*graph.instagram.com/logging*',
+    '*connect.facebook.net/*', '*facebook.com/tr*', '*google-analytics.com/*', '*googletagmanager.com/*',
+]
+
+
+class NetworkImageCapture:
+    """
+    Incremental capture of image responses from Chrome's performance log.
+    
+    The log is drained periodically while scrolling so Chrome's buffer never
+    overflows. Entries are pre-filtered with cheap substring checks and only
+    image responses are kept (in a bounded buffer) for JSON parsing later.
+    """
+    
+    def __init__(self, max_pending=5000):
+        """
+        Args:
+            max_pending: Maximum number of unparsed image responses to buffer
+        """
+        self.pending = deque(maxlen=max_pending)
+        self.entries_seen = 0
+        self.images_seen = 0
+        self.dropped = 0
+    
+    def drain(self, driver) -> int:
+        """Read (and thereby clear) the browser's performance log. Returns entries read."""
+        logs = driver.get_log('performance')
+        self.entries_seen += len(logs)
+        for log in logs:
+            message = log.get('message', '')
+            # Skip everything that is not an image response without parsing it
+            if '"Network.responseReceived"' not in message or '"image/' not in message:
+                continue
+            if len(self.pending) == self.pending.maxlen:
+                self.dropped += 1
+            self.pending.append(message)
+        return len(logs)
+    
+    def pop_image_urls(self) -> List[str]:
+        """Parse buffered responses and return their image URLs."""
+        urls = []
+        while self.pending:
+            try:
+                event = json.loads(self.pending.popleft())['message']
+                response = event['params']['response']
+            except (json.JSONDecodeError, KeyError):
+                continue  # Skip malformed logs
+            if event.get('method') != 'Network.responseReceived':
+                continue
+            if response.get('mimeType', '').lower().startswith('image/') and response.get('url'):
+                urls.append(response['url'])
+        self.images_seen += len(urls)
+        return urls
+
+
+class RateLimiter:
+    """Thread-safe request spacing shared by all download workers (a global rate budget)."""
+    
+    def __init__(self, requests_per_second=2.0):
+        """
+        Args:
+            requests_per_second: Maximum sustained download rate across all users of this limiter
+        """
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+    
+    def wait(self):
+        """Block until the next request is allowed."""
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class StreamingDownloader:
+    """Background worker that downloads one profile's image URLs as they are queued."""
+    
+    def __init__(self, download_image, session: requests.Session, output_dir: Path, rate_limiter: RateLimiter,
+                 first_index=1):
+        """
+        Args:
+            download_image: Callable(session, url, output_dir, index) -> bool
+            session: requests session used for all downloads of this profile
+            output_dir: Directory the images are saved to
+            rate_limiter: Limiter consulted before every download
+            first_index: Index of the first image (when earlier indexes are already taken)
+        """
+        self.download_image = download_image
+        self.session = session
+        self.output_dir = output_dir
+        self.rate_limiter = rate_limiter
+        self.first_index = first_index
+        self.queue = queue.Queue()
+        self.stats = {'downloaded': 0, 'failed': 0}
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def put(self, url: str):
+        """Queue a URL for download."""
+        self.queue.put(url)
+    
+    def pending(self) -> int:
+        """Approximate number of URLs still waiting."""
+        return self.queue.qsize()
+    
+    def _run(self):
+        """Consume the queue until the stop sentinel (None) arrives."""
+        index = self.first_index - 1
+        while True:
+            url = self.queue.get()
+            if url is None:
+                break
+            index += 1
+            self.rate_limiter.wait()
+            if self.download_image(self.session, url, self.output_dir, index):
+                self.stats['downloaded'] += 1
+            else:
+                self.stats['failed'] += 1
+    
+    def close(self):
+        """Stop accepting URLs; the worker exits once the queue is drained."""
+        self.queue.put(None)
+    
+    def join(self) -> int:
+        """Wait for the worker to finish. Returns the number of images downloaded."""
+        self.thread.join()
+        stats = self.stats
+        print(f"\n✅ Download complete ({self.output_dir}): {stats['downloaded']} successful, {stats['failed']} failed")
+        return stats['downloaded']
 
 
 class InstagramBrowserDownloader:
     """Browser-based Instagram image downloader using Selenium."""
     
-    def __init__(self, headless=False, use_existing_profile=False, profile_path=None):
+    def __init__(self, headless=False, use_existing_profile=False, profile_path=None, rate_limiter=None,
+                 session_store=None, block_resources=False):
         """
         Initialize the browser downloader.
         
@@ -41,15 +293,32 @@ class InstagramBrowserDownloader:
             headless: Run browser in headless mode (no GUI)
             use_existing_profile: Use existing Chrome profile (to use logged-in session)
             profile_path: Path to Chrome user profile (default: ~/.config/google-chrome/Default)
+            rate_limiter: Shared RateLimiter for image downloads (default: 2 downloads/second)
+            session_store: SessionStore used to persist and restore login cookies
+            block_resources: Block videos, fonts and analytics while scrolling (see BLOCKED_URL_PATTERNS)
         """
         self.headless = headless
+        self.block_resources = block_resources
         self.use_existing_profile = use_existing_profile
         self.profile_path = profile_path
         self.driver = None
         self.image_urls: Set[str] = set()
+        self.rate_limiter = rate_limiter or RateLimiter(2.0)
+        self.session_store = session_store or SessionStore()
+        self.session = None
+        self.streamer = None
+        self.pending_downloads: List[StreamingDownloader] = []
+        self.network_capture = NetworkImageCapture()
+        
+    def setup_driver(self, block_resources=None):
+        """
+        Set up Chrome driver with appropriate options.
         
-    def setup_driver(self):
-        """Set up Chrome driver with appropriate options."""
+        Args:
+            block_resources: Override the block_resources setting given to the constructor
+        """
+        if block_resources is not None:
+            self.block_resources = block_resources
         chrome_options = Options()
         
         if self.headless:
@@ -77,8 +346,9 @@ class InstagramBrowserDownloader:
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option('useAutomationExtension', False)
         
-        # Enable performance logging to capture network requests
+        # Enable performance logging to capture network requests (Network domain only)
         chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        chrome_options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
         
         # Set user agent
         chrome_options.add_argument('--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
@@ -89,6 +359,10 @@ class InstagramBrowserDownloader:
             self.driver.execute_cdp_cmd('Page.addScriptToEvaluateOnNewDocument', {
                 'source': 'Object.defineProperty(navigator, "webdriver", {get: () => undefined})'
             })
+            if self.block_resources:
+                self.block_unneeded_resources()
+            if not self.use_existing_profile:
+                self.restore_cookies()
             print("✅ Browser initialized successfully")
             return True
         except Exception as e:
@@ -98,69 +372,74 @@ class InstagramBrowserDownloader:
             print("   or download from https://chromedriver.chromium.org/")
             return False
     
-    def scroll_to_load_all(self, max_scrolls=200, scroll_delay=2.5):
+    def block_unneeded_resources(self) -> bool:
+        """
+        Block BLOCKED_URL_PATTERNS in the browser (via CDP, before any page loads).
+        
+        Blocked requests fail immediately inside Chrome, so scrolling long profiles
+        doesn't spend bandwidth and memory on videos and trackers. Image requests
+        are untouched and still recorded.
+        """
+        try:
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+        except Exception as e:
+            print(f"⚠️  Could not block unneeded resources: {e}")
+            return False
+        print(f"🚫 Blocking videos, fonts and analytics ({len(BLOCKED_URL_PATTERNS)} URL patterns)")
+        return True
+    
+    def scroll_to_load_all(self, max_scrolls=200, idle_ms=800, max_wait=10.0, stall_limit=4):
         """
         Scroll through the Instagram profile to load all images.
-        Uses incremental scrolling to trigger lazy loading.
+        Uses incremental scrolling to trigger lazy loading, and waits on page
+        activity (DOM mutations and finished network requests) instead of fixed
+        sleeps, so each scroll only takes as long as the page needs to settle.
+        Image URLs are harvested after every scroll, since Instagram removes
+        older posts from the DOM as the grid grows.
         
         Args:
             max_scrolls: Maximum number of scroll attempts
-            scroll_delay: Delay between scrolls (seconds)
+            idle_ms: Quiet period (milliseconds) after which the page counts as settled
+            max_wait: Maximum time to wait for a single scroll to settle (seconds)
+            stall_limit: Stop after this many scrolls at the bottom without new content
+                (same page height and post count, no new image URLs)
         """
-        print("📜 Scrolling to load all images (this may take a few minutes)...")
+        print("📜 Scrolling to load all images...")
+        
+        # Install the activity observers once; every scroll below is a single script call
+        self.driver.execute_script(SCROLL_OBSERVER_JS)
+        self.driver.set_script_timeout(max_wait + 5)
+        wait_ms = int(max_wait * 1000)
         
-        last_height = self.driver.execute_script("return document.body.scrollHeight")
+        state = self.driver.execute_script(SCROLL_STATE_JS)
+        last_height = state['height']
+        last_articles = state['articles']
         scroll_count = 0
-        no_change_count = 0
         last_image_count = 0
         consecutive_no_change = 0
+        started = time.time()
         
         while scroll_count < max_scrolls:
-            # Scroll incrementally (not all the way to bottom at once)
-            # This helps trigger lazy loading better
-            current_scroll = self.driver.execute_script("return window.pageYOffset;")
-            window_height = self.driver.execute_script("return window.innerHeight;")
-            
-            # Scroll down by 80% of window height (more gradual)
-            scroll_amount = int(window_height * 0.8)
-            self.driver.execute_script(f"window.scrollBy(0, {scroll_amount});")
-            time.sleep(scroll_delay)
-            
-            # Also scroll to bottom every 5 scrolls to ensure we reach the end
-            if scroll_count % 5 == 0:
-                self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(scroll_delay + 1)  # Extra wait when scrolling to bottom
-            
-            # Wait for images to load
-            time.sleep(1.5)
-            
-            # Check if new content loaded
-            new_height = self.driver.execute_script("return document.body.scrollHeight")
-            current_scroll_pos = self.driver.execute_script("return window.pageYOffset;")
-            max_scroll = self.driver.execute_script("return document.body.scrollHeight - window.innerHeight;")
+            # Scroll incrementally (80% of the viewport) to trigger lazy loading,
+            # and jump to the bottom every 5 scrolls to ensure we reach the end
+            mode = 'bottom' if scroll_count % 5 == 0 else 'step'
+            state = self.driver.execute_async_script(SCROLL_STEP_JS, mode, idle_ms, wait_ms)
+            new_urls = self.harvest_urls(state['urls']) + self.drain_network_log()
             
-            # Count images from network logs to see progress
-            try:
-                # Try to count visible post containers
-                articles = self.driver.find_elements(By.TAG_NAME, "article")
-                current_images = len(articles)
-            except:
-                current_images = 0
-            
-            # Check if we're at the bottom
-            at_bottom = current_scroll_pos >= max_scroll - 100  # Within 100px of bottom
+            new_height = state['height']
+            current_images = state['articles']
+            at_bottom = state['offset'] >= state['height'] - state['viewport'] - 100  # Within 100px of bottom
             
-            if new_height == last_height:
-                no_change_count += 1
+            if new_height == last_height and current_images == last_articles and not new_urls:
                 consecutive_no_change += 1
                 
-                # If we're at bottom AND no new content for several scrolls, we're done
-                if at_bottom and consecutive_no_change >= 8:
+                # If we're at bottom AND several scrolls brought no new content, we're done
+                if at_bottom and consecutive_no_change >= stall_limit:
                     print(f"   ✅ Reached end of page after {scroll_count + 1} scrolls")
                     break
             else:
                 consecutive_no_change = 0
-                no_change_count = 0
                 if current_images > last_image_count:
                     print(f"   📜 Scrolled {scroll_count + 1} times, found {current_images} posts so far...")
                     last_image_count = current_images
@@ -168,118 +447,56 @@ class InstagramBrowserDownloader:
                     print(f"   📜 Scrolled {scroll_count + 1} times, page height: {new_height}px...")
             
             last_height = new_height
+            last_articles = current_images
             scroll_count += 1
         
-        # Final comprehensive scroll to ensure everything is loaded
+        # Final passes to trigger any remaining lazy loads (bottom, back up a bit, bottom)
         print("   🔄 Final scroll to ensure all content is loaded...")
-        for i in range(3):
-            self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(3)
-            # Scroll back up a bit and down again to trigger lazy loads
-            self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight * 0.7);")
-            time.sleep(2)
+        for mode in ('bottom', 'rewind', 'bottom'):
+            state = self.driver.execute_async_script(SCROLL_STEP_JS, mode, idle_ms, wait_ms)
+            self.harvest_urls(state['urls'])
+            self.drain_network_log()
         
-        # One final scroll to bottom
-        self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(3)
+        elapsed = time.time() - started
+        print(f"✅ Finished scrolling ({scroll_count} scrolls in {elapsed:.1f}s, final page height: {state['height']}px)")
+        print(f"   📸 Harvested {len(self.image_urls)} image URLs while scrolling")
+    
+    def filter_image_urls(self, candidates) -> Set[str]:
+        """Keep Instagram post images from candidate URLs and add high-resolution variants."""
+        return normalize_image_urls(candidates)
+    
+    def harvest_urls(self, candidates) -> int:
+        """
+        Record new image URLs and queue them for download when streaming.
         
-        print(f"✅ Finished scrolling ({scroll_count} scrolls, final page height: {self.driver.execute_script('return document.body.scrollHeight')}px)")
+        Returns:
+            Number of previously unseen image URLs
+        """
+        new_urls = self.filter_image_urls(candidates) - self.image_urls
+        self.image_urls.update(new_urls)
+        if self.streamer is not None:
+            for url in sorted(new_urls):
+                self.streamer.put(url)
+        return len(new_urls)
     
     def extract_image_urls_from_dom(self):
-        """Extract image URLs from the page DOM using multiple methods."""
-        print("🔍 Extracting image URLs from page...")
+        """
+        Extract image URLs from the page DOM.
         
-        image_urls = set()
+        All candidates (img src/srcset/data-src/data-srcset and inline
+        background-image URLs) are collected by a single in-page script and
+        returned as one JSON array; filtering happens in Python afterwards.
+        """
+        print("🔍 Extracting image URLs from page...")
         
         try:
-            # Method 1: Find all img tags (most comprehensive)
-            img_elements = self.driver.find_elements(By.TAG_NAME, "img")
-            print(f"   Found {len(img_elements)} img elements")
-            
-            for img in img_elements:
-                # Try multiple attributes
-                for attr in ['src', 'srcset', 'data-src', 'data-srcset']:
-                    value = img.get_attribute(attr)
-                    if value:
-                        # Handle srcset (multiple URLs)
-                        if ',' in value:
-                            urls = [u.strip().split()[0] for u in value.split(',')]
-                        else:
-                            urls = [value]
-                        
-                        for url in urls:
-                            if url and ("instagram.com" in url or "cdninstagram.com" in url):
-                                # Skip thumbnails and avatars
-                                if any(skip in url.lower() for skip in ['/s150x150/', '/s50x50/', 'avatar', 'profile_pic', 'icon']):
-                                    continue
-                                image_urls.add(url)
-            
-            # Method 2: Find images in article containers (Instagram posts)
-            try:
-                articles = self.driver.find_elements(By.TAG_NAME, "article")
-                print(f"   Found {len(articles)} article containers")
-                for article in articles:
-                    imgs = article.find_elements(By.TAG_NAME, "img")
-                    for img in imgs:
-                        src = img.get_attribute("src") or img.get_attribute("data-src")
-                        if src and ("instagram.com" in src or "cdninstagram.com" in src):
-                            if not any(skip in src.lower() for skip in ['/s150x150/', '/s50x50/', 'avatar']):
-                                image_urls.add(src)
-            except Exception as e:
-                print(f"   ⚠️  Error extracting from articles: {e}")
-            
-            # Method 3: Find background images in style attributes
-            try:
-                elements_with_bg = self.driver.find_elements(By.XPATH, "//*[@style]")
-                for elem in elements_with_bg:
-                    style = elem.get_attribute("style")
-                    if style:
-                        # Extract URL from background-image: url(...)
-                        urls = re.findall(r'url\(["\']?([^"\']+)["\']?\)', style)
-                        for url in urls:
-                            if "instagram.com" in url or "cdninstagram.com" in url:
-                                if not any(skip in url.lower() for skip in ['/s150x150/', '/s50x50/', 'avatar']):
-                                    image_urls.add(url)
-            except Exception as e:
-                print(f"   ⚠️  Error extracting background images: {e}")
-            
-            # Method 4: Extract from Instagram's data structures (if available in page source)
-            try:
-                page_source = self.driver.page_source
-                # Look for image URLs in the page source
-                url_pattern = r'https://[^"\s]*cdninstagram\.com[^"\s]*\.(jpg|jpeg|png|webp)[^"\s]*'
-                found_urls = re.findall(url_pattern, page_source, re.IGNORECASE)
-                for match in found_urls:
-                    # Reconstruct full URL (pattern might have captured partial)
-                    # This is a fallback, so we'll be lenient
-                    pass  # Skip this method as it's unreliable
-            except:
-                pass
+            started = time.time()
+            candidates = self.driver.execute_script(COLLECT_ALL_CANDIDATES_JS) or []
+            print(f"   Collected {len(candidates)} candidate URLs in {time.time() - started:.2f}s")
             
             # Normalize URLs and get high-resolution versions
-            normalized_urls = set()
-            for url in image_urls:
-                # Skip obvious non-post images
-                if any(skip in url.lower() for skip in ['/s150x150/', '/s50x50/', 'avatar', 'profile_pic', 'icon', 'logo']):
-                    continue
-                
-                # Try to get higher resolution version
-                # Instagram URLs often have size parameters like s640x640, s1080x1080
-                if '/s640x640/' in url:
-                    # Try 1080p version
-                    high_res = url.replace('/s640x640/', '/s1080x1080/')
-                    normalized_urls.add(high_res)
-                elif '/s480x480/' in url:
-                    high_res = url.replace('/s480x480/', '/s1080x1080/')
-                    normalized_urls.add(high_res)
-                elif '/s320x320/' in url:
-                    high_res = url.replace('/s320x320/', '/s1080x1080/')
-                    normalized_urls.add(high_res)
-                
-                # Also keep original
-                normalized_urls.add(url)
-            
-            self.image_urls.update(normalized_urls)
+            normalized_urls = self.filter_image_urls(candidates)
+            self.harvest_urls(normalized_urls)
             print(f"   ✅ Found {len(normalized_urls)} unique image URLs from DOM")
             
         except Exception as e:
@@ -287,56 +504,78 @@ class InstagramBrowserDownloader:
             import traceback
             traceback.print_exc()
     
+    def drain_network_log(self) -> int:
+        """
+        Move image responses captured since the last call into the harvest.
+        
+        Returns:
+            Number of previously unseen image URLs
+        """
+        if self.network_capture is None:
+            return 0
+        try:
+            self.network_capture.drain(self.driver)
+        except Exception as e:
+            print(f"   ⚠️  Network capture disabled: {e}")
+            self.network_capture = None  # Performance logging unavailable; DOM harvesting still works
+            return 0
+        return self.harvest_urls(self.network_capture.pop_image_urls())
+    
     def extract_image_urls_from_network(self):
         """Extract image URLs from browser network logs (requires performance logging)."""
         print("🔍 Extracting image URLs from network requests...")
         
+        if self.network_capture is None:
+            print("   (Network capture unavailable - DOM extraction should work)")
+            return
+        
+        new_count = self.drain_network_log()
+        capture = self.network_capture or NetworkImageCapture()
+        print(f"   Analyzed {capture.entries_seen} network log entries, {capture.images_seen} image responses")
+        if capture.dropped:
+            print(f"   ⚠️  {capture.dropped} image responses dropped (capture buffer full)")
+        print(f"   ✅ Found {new_count} new image URLs from network")
+    
+    def restore_cookies(self) -> bool:
+        """Load saved login cookies into a fresh browser (via CDP, no page load needed)."""
+        cookies = self.session_store.load_cookies()
+        if not cookies:
+            return False
+        params = []
+        for cookie in cookies:
+            param = {
+                'name': cookie['name'],
+                'value': cookie['value'],
+                'domain': cookie.get('domain', '.instagram.com'),
+                'path': cookie.get('path', '/'),
+                'secure': cookie.get('secure', False),
+                'httpOnly': cookie.get('httpOnly', False),
+            }
+            if cookie.get('expiry'):
+                param['expires'] = cookie['expiry']
+            if cookie.get('sameSite'):
+                param['sameSite'] = cookie['sameSite']
+            params.append(param)
         try:
-            # Get performance logs (requires ChromeOptions with logging)
-            logs = self.driver.get_log('performance')
-            image_urls = set()
-            
-            print(f"   Analyzing {len(logs)} network log entries...")
-            
-            for log in logs:
-                try:
-                    message = json.loads(log['message'])
-                    if message['message']['method'] == 'Network.responseReceived':
-                        response = message['message']['params']['response']
-                        url = response.get('url', '')
-                        mime_type = response.get('mimeType', '')
-                        
-                        # Check if it's an image from Instagram
-                        if url and ('instagram.com' in url or 'cdninstagram.com' in url):
-                            # Check mime type or URL pattern
-                            is_image = 'image' in mime_type.lower() if mime_type else False
-                            looks_like_image = any(ext in url.lower() for ext in ['.jpg', '.jpeg', '.png', '.webp']) or '/s' in url
-                            
-                            if is_image or looks_like_image:
-                                # Skip small images (thumbnails, icons, avatars)
-                                if not any(skip in url.lower() for skip in ['/s150x150/', '/s50x50/', 'avatar', 'profile_pic', 'icon', 'logo']):
-                                    image_urls.add(url)
-                except (json.JSONDecodeError, KeyError) as e:
-                    continue  # Skip malformed logs
-            
-            self.image_urls.update(image_urls)
-            print(f"   ✅ Found {len(image_urls)} image URLs from network")
-            
+            self.driver.execute_cdp_cmd('Network.setCookies', {'cookies': params})
         except Exception as e:
-            print(f"   ⚠️  Could not extract from network logs: {e}")
-            print("   (This is optional - DOM extraction should work)")
+            print(f"⚠️  Could not restore saved cookies: {e}")
+            return False
+        print("🍪 Restored saved Instagram login cookies")
+        return True
     
-    def download_images(self, output_dir: Path):
-        """Download all collected image URLs."""
-        if not self.image_urls:
-            print("❌ No image URLs found to download")
-            return 0
-        
-        print(f"\n📥 Downloading {len(self.image_urls)} images...")
-        output_dir.mkdir(parents=True, exist_ok=True)
-        
-        downloaded = 0
-        failed = 0
+    def save_cookies(self):
+        """Persist the browser's login cookies for later runs and the requests-based scripts."""
+        try:
+            if self.session_store.save_cookies(self.driver.get_cookies()):
+                print("🍪 Saved login cookies for reuse")
+        except Exception as e:
+            print(f"⚠️  Could not save cookies: {e}")
+    
+    def create_session(self) -> requests.Session:
+        """Get the requests session carrying the browser's cookies (built once per browser)."""
+        if self.session is not None:
+            return self.session
         
         # Get cookies from browser session
         cookies = self.driver.get_cookies()
@@ -349,52 +588,115 @@ class InstagramBrowserDownloader:
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Referer': 'https://www.instagram.com/',
         })
+        self.session = session
+        return session
+    
+    def download_image(self, session: requests.Session, url: str, output_dir: Path, index: int) -> bool:
+        """Download a single image as image_{index}. Returns True on success."""
+        try:
+            # Save with unique filename (written atomically, resumed if truncated)
+            download_file(session, url, output_dir / f"image_{index:04d}{image_extension(url)}")
+            return True
+        except Exception as e:
+            print(f"\n   ⚠️  Failed to download {url}: {e}")
+            return False
+    
+    def download_images(self, output_dir: Path):
+        """Download all collected image URLs."""
+        if not self.image_urls:
+            print("❌ No image URLs found to download")
+            return 0
+        
+        print(f"\n📥 Downloading {len(self.image_urls)} images...")
+        output_dir.mkdir(parents=True, exist_ok=True)
+        
+        downloaded = 0
+        failed = 0
+        session = self.create_session()
         
         for i, url in enumerate(self.image_urls, 1):
-            try:
-                print(f"   📥 [{i}/{len(self.image_urls)}] Downloading...", end='\r')
-                
-                # Determine file extension
-                parsed = urlparse(url)
-                path = parsed.path
-                ext = Path(path).suffix
-                if not ext or ext not in ['.jpg', '.jpeg', '.png', '.webp']:
-                    ext = '.jpg'
-                
-                # Download image
-                response = session.get(url, timeout=30, stream=True)
-                response.raise_for_status()
-                
-                # Save with unique filename
-                filename = output_dir / f"image_{i:04d}{ext}"
-                with open(filename, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                
+            print(f"   📥 [{i}/{len(self.image_urls)}] Downloading...", end='\r')
+            self.rate_limiter.wait()  # Small delay between downloads
+            if self.download_image(session, url, output_dir, i):
                 downloaded += 1
-                time.sleep(0.5)  # Small delay between downloads
-                
-            except Exception as e:
+            else:
                 failed += 1
-                print(f"\n   ⚠️  Failed to download {url}: {e}")
         
         print(f"\n✅ Download complete: {downloaded} successful, {failed} failed")
         return downloaded
     
-    def download_profile(self, username: str, output_dir: str = None):
+    def start_streaming_downloads(self, output_dir: Path):
+        """Start a background worker that downloads image URLs as soon as they are harvested."""
+        output_dir.mkdir(parents=True, exist_ok=True)
+        # The WebDriver is not thread-safe, so cookies are read here on the calling thread
+        session = self.create_session()
+        self.streamer = StreamingDownloader(self.download_image, session, output_dir, self.rate_limiter)
+        
+        # Anything harvested before streaming started still needs downloading
+        for url in sorted(self.image_urls):
+            self.streamer.put(url)
+    
+    def finish_streaming_downloads(self, wait=True) -> int:
+        """
+        Stop feeding the current download worker.
+        
+        Args:
+            wait: Block until its queue is drained. Otherwise the worker keeps
+                  downloading in the background (see wait_for_downloads).
+        
+        Returns:
+            Number of images downloaded (0 when not waiting)
+        """
+        streamer, self.streamer = self.streamer, None
+        if streamer is None:
+            return 0
+        
+        streamer.close()
+        if not wait:
+            self.pending_downloads.append(streamer)
+            return 0
+        
+        if streamer.pending():
+            print(f"\n📥 Finishing {streamer.pending()} queued downloads...")
+        return streamer.join()
+    
+    def wait_for_downloads(self) -> int:
+        """Wait for downloads left running by finish_streaming_downloads(wait=False)."""
+        downloaded = 0
+        while self.pending_downloads:
+            downloaded += self.pending_downloads.pop(0).join()
+        return downloaded
+    
+    def close(self):
+        """Quit the browser."""
+        self.session = None
+        if self.driver:
+            self.driver.quit()
+            self.driver = None
+            print("🔒 Browser closed")
+    
+    def download_profile(self, username: str, output_dir: str = None, keep_browser_open=False, wait_for_downloads=True):
         """
         Main method to download all images from an Instagram profile.
         
         Args:
             username: Instagram username (without @)
             output_dir: Output directory for images
+            keep_browser_open: Leave the browser running so the next profile can reuse it
+            wait_for_downloads: Block until this profile's downloads finish. When False they
+                                continue in the background while the next profile scrolls.
         """
         if output_dir is None:
             output_dir = f"./instagram_downloads/{username}"
         
         output_path = Path(output_dir)
         
-        if not self.setup_driver():
+        # Reset per-profile state (the browser itself may be reused)
+        self.image_urls = set()
+        if self.network_capture is not None:
+            self.network_capture = NetworkImageCapture()
+        
+        if self.driver is None and not self.setup_driver():
             return False
         
         try:
@@ -429,16 +731,22 @@ class InstagramBrowserDownloader:
                 print("❌ Failed to load Instagram page")
                 return False
             
+            # Keep the (possibly refreshed) login so later runs can skip logging in
+            self.save_cookies()
+            
             # Check page height - if it's very small, we might not be seeing all content
             page_height = self.driver.execute_script("return document.body.scrollHeight")
             if page_height < 2000:
                 print(f"⚠️  Page height is only {page_height}px - Instagram may be limiting content.")
                 print("   Try using --use-existing-profile with Chrome closed to use your logged-in session.")
             
+            # Download images in the background while scrolling harvests new URLs
+            self.start_streaming_downloads(output_path)
+            
             # Scroll to load all images (use more scrolls to ensure we get everything)
-            self.scroll_to_load_all(max_scrolls=200, scroll_delay=2.5)
+            self.scroll_to_load_all(max_scrolls=200)
             
-            # Extract image URLs
+            # Final sweep for anything the scroll harvest missed
             self.extract_image_urls_from_dom()
             # Try network extraction (optional)
             try:
@@ -446,51 +754,145 @@ class InstagramBrowserDownloader:
             except:
                 pass  # Network extraction is optional
             
+            print(f"\n📸 Found {len(self.image_urls)} unique image URLs")
+            
+            # Wait for the remaining queued downloads (or leave them running)
+            self.finish_streaming_downloads(wait=wait_for_downloads)
+            
             if not self.image_urls:
                 print("❌ No images found. The account might be private or the page structure changed.")
                 return False
             
-            print(f"\n📸 Found {len(self.image_urls)} unique image URLs")
-            
-            # Download images
-            downloaded = self.download_images(output_path)
-            
-            print(f"\n✅ Complete! Images saved to: {output_path.absolute()}")
+            if wait_for_downloads:
+                print(f"\n✅ Complete! Images saved to: {output_path.absolute()}")
+            else:
+                print(f"\n✅ Finished scrolling @{username}; downloads continue in the background")
             return True
             
         except Exception as e:
             print(f"❌ Error: {e}")
             return False
         finally:
-            if self.driver:
-                self.driver.quit()
-                print("🔒 Browser closed")
+            self.finish_streaming_downloads(wait=wait_for_downloads)
+            if not keep_browser_open:
+                self.close()
+
+
+def download_profiles(usernames: List[str], output_root: str = None, browsers=2, downloads_per_second=2.0,
+                      headless=False, use_existing_profile=False, profile_path=None,
+                      downloader_class=None, block_resources=False) -> Dict[str, bool]:
+    """
+    Download several profiles across a small pool of reusable browsers.
+    
+    Each browser works through the shared username queue, keeping Chrome open
+    between profiles and scrolling the next profile while the previous one's
+    images are still downloading. All downloads share one global rate budget.
+    
+    Args:
+        usernames: Instagram usernames (without @)
+        output_root: Parent directory; each profile goes to {output_root}/{username}
+        browsers: Number of browsers to run in parallel
+        downloads_per_second: Global download rate across all browsers
+        headless, use_existing_profile, profile_path, block_resources: Passed to the downloader
+        downloader_class: InstagramBrowserDownloader (default) or PlaywrightBrowserDownloader
+    
+    Returns:
+        Mapping of username to whether it completed successfully
+    """
+    if output_root is None:
+        output_root = "./instagram_downloads"
+    if use_existing_profile and browsers > 1:
+        # Chrome locks a user data directory to a single running instance
+        print("⚠️  --use-existing-profile supports only one browser; running sequentially")
+        browsers = 1
+    
+    downloader_class = downloader_class or InstagramBrowserDownloader
+    rate_limiter = RateLimiter(downloads_per_second)
+    jobs = queue.Queue()
+    for username in usernames:
+        jobs.put(username)
+    results: Dict[str, bool] = {}
+    started = time.time()
+    
+    def run_browser():
+        downloader = downloader_class(
+            headless=headless,
+            use_existing_profile=use_existing_profile,
+            profile_path=profile_path,
+            rate_limiter=rate_limiter,
+            block_resources=block_resources,
+        )
+        try:
+            while True:
+                try:
+                    username = jobs.get_nowait()
+                except queue.Empty:
+                    break
+                print(f"\n{'=' * 60}\n👤 @{username}\n{'=' * 60}")
+                results[username] = downloader.download_profile(
+                    username,
+                    str(Path(output_root) / username),
+                    keep_browser_open=True,
+                    wait_for_downloads=False,
+                )
+        finally:
+            downloader.close()
+            downloader.wait_for_downloads()
+    
+    workers = [threading.Thread(target=run_browser) for _ in range(max(1, min(browsers, len(usernames))))]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    
+    succeeded = sum(1 for ok in results.values() if ok)
+    print(f"\n✅ Batch complete: {succeeded}/{len(usernames)} profiles in {time.time() - started:.1f}s")
+    for username in usernames:
+        print(f"   {'✅' if results.get(username) else '❌'} @{username}")
+    return results
 
 
 def main():
     """Main function."""
     if len(sys.argv) < 2:
-        print("Usage: python instagram_downloader_browser.py <username> [options]")
+        print("Usage: python instagram_downloader_browser.py <username> [<username> ...] [options]")
         print("\nOptions:")
         print("  --headless              Run browser in headless mode (no GUI)")
         print("  --use-existing-profile  Use existing Chrome profile (for logged-in session)")
         print("  --profile-path PATH      Path to Chrome user profile")
-        print("  --output-dir DIR         Output directory for images")
+        print("  --output-dir DIR         Output directory for images (parent directory in batch mode)")
+        print("  --batch FILE             Read usernames from FILE (one per line, # for comments)")
+        print("  --browsers N             Browsers to run in parallel in batch mode (default: 2)")
+        print("  --rate N                 Global downloads per second in batch mode (default: 2)")
+        print("  --playwright             Use the Playwright backend instead of Selenium/ChromeDriver")
+        print("  --block-resources        Don't load videos, fonts and analytics while scrolling (faster)")
         print("\nExample:")
         print("  python instagram_downloader_browser.py grapeot")
         print("  python instagram_downloader_browser.py grapeot --use-existing-profile")
         print("  python instagram_downloader_browser.py grapeot --headless --output-dir ./images")
+        print("  python instagram_downloader_browser.py --batch accounts.txt --headless --browsers 3")
+        print("  python instagram_downloader_browser.py grapeot --headless --playwright")
         sys.exit(1)
     
-    username = sys.argv[1].replace('@', '').replace('https://www.instagram.com/', '').rstrip('/')
-    
     # Parse arguments
     headless = '--headless' in sys.argv
     use_existing_profile = '--use-existing-profile' in sys.argv
+    block_resources = '--block-resources' in sys.argv
+    downloader_class = InstagramBrowserDownloader
+    if '--playwright' in sys.argv:
+        try:
+            from instagram_downloader_playwright import PlaywrightBrowserDownloader
+        except ImportError:
+            print("❌ Playwright is not installed: pip install playwright && playwright install chromium")
+            sys.exit(1)
+        downloader_class = PlaywrightBrowserDownloader
     output_dir = None
     profile_path = None
+    browsers = 2
+    rate = 2.0
+    usernames = []
     
-    i = 2
+    i = 1
     while i < len(sys.argv):
         if sys.argv[i] == '--output-dir' and i + 1 < len(sys.argv):
             output_dir = sys.argv[i + 1]
@@ -498,18 +900,50 @@ def main():
         elif sys.argv[i] == '--profile-path' and i + 1 < len(sys.argv):
             profile_path = sys.argv[i + 1]
             i += 2
+        elif sys.argv[i] == '--batch' and i + 1 < len(sys.argv):
+            with open(sys.argv[i + 1], 'r', encoding='utf-8') as f:
+                usernames.extend(line.split('#')[0].strip() for line in f if line.split('#')[0].strip())
+            i += 2
+        elif sys.argv[i] == '--browsers' and i + 1 < len(sys.argv):
+            browsers = int(sys.argv[i + 1])
+            i += 2
+        elif sys.argv[i] == '--rate' and i + 1 < len(sys.argv):
+            rate = float(sys.argv[i + 1])
+            i += 2
+        elif not sys.argv[i].startswith('--'):
+            usernames.append(sys.argv[i])
+            i += 1
         else:
             i += 1
     
-    downloader = InstagramBrowserDownloader(
+    usernames = [u.replace('@', '').replace('https://www.instagram.com/', '').rstrip('/') for u in usernames]
+    if not usernames:
+        print("❌ No usernames given")
+        sys.exit(1)
+    
+    if len(usernames) > 1:
+        download_profiles(
+            usernames,
+            output_root=output_dir,
+            browsers=browsers,
+            downloads_per_second=rate,
+            headless=headless,
+            use_existing_profile=use_existing_profile,
+            profile_path=profile_path,
+            downloader_class=downloader_class,
+            block_resources=block_resources,
+        )
+        return
+    
+    downloader = downloader_class(
         headless=headless,
         use_existing_profile=use_existing_profile,
-        profile_path=profile_path
+        profile_path=profile_path,
+        block_resources=block_resources,
     )
     
-    downloader.download_profile(username, output_dir)
+    downloader.download_profile(usernames[0], output_dir)
 
 
 if __name__ == "__main__":
     main()
-
@@ -12,23 +12,48 @@ import re
 import time
 import random
 from pathlib import Path
-from urllib.parse import urlparse
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from file_download import download_file
+from session_store import SessionStore
+from url_classifier import normalize_image_urls, image_extension, looks_like_image, is_post_image
+
+JSON_SCRIPT_OPEN = '<script type="application/json"'
+SHARED_DATA_MARKER = 'window._sharedData'
+JSON_DECODER = json.JSONDecoder()
+
+# Keys that mark a dict as a post/media node in either GraphQL or API JSON
+MEDIA_NODE_KEYS = {'display_url', 'display_resources', 'image_versions2', 'thumbnail_src'}
+
+# Profile timeline pagination (GraphQL query for a user's posts)
+GRAPHQL_QUERY_HASH = '69cba40317214236af40e7efa697781d'
+IG_APP_ID = '936619743392459'
+PAGE_SIZE = 12
+
+# Saved in the output directory so an interrupted crawl resumes mid-profile
+CHECKPOINT_FILE = '.pagination_checkpoint.json'
+
+# Fallback URL scan: one character class, no nested quantifiers, so matching is linear
+HTML_URL_RE = re.compile(r'https:(?://|\\/\\/)[^"\'\s<>]+')
 
 
 class InstagramDownloader:
     """Manual Instagram downloader with anti-bot measures."""
     
-    def __init__(self, delay_min=2, delay_max=5):
+    def __init__(self, delay_min=2, delay_max=5, session_store=None, base_url="https://www.instagram.com"):
         """
         Initialize downloader with anti-bot settings.
         
         Args:
             delay_min: Minimum delay between requests (seconds)
             delay_max: Maximum delay between requests (seconds)
+            session_store: SessionStore to load saved login cookies from (default: shared store)
+            base_url: Instagram origin (override to point at a local stub server)
         """
         self.delay_min = delay_min
         self.delay_max = delay_max
+        self.base_url = base_url.rstrip('/')
         self.session = requests.Session()
         
         # Set realistic browser headers
@@ -44,6 +69,18 @@ class InstagramDownloader:
             'Sec-Fetch-Site': 'none',
             'Cache-Control': 'max-age=0',
         })
+        
+        # Reuse login cookies saved by the browser downloader, if still valid
+        if (session_store or SessionStore()).apply_cookies(self.session):
+            print("🍪 Using saved Instagram login cookies")
+    
+    def clone_session(self):
+        """New session with the same headers, cookies and proxies (a Session must not be shared between threads)."""
+        session = requests.Session()
+        session.headers.update(self.session.headers)
+        session.cookies.update(self.session.cookies)
+        session.proxies.update(self.session.proxies)
+        return session
     
     def random_delay(self):
         """Add random delay to mimic human behavior."""
@@ -52,7 +89,7 @@ class InstagramDownloader:
     
     def get_profile_page(self, username):
         """Fetch the profile page HTML."""
-        url = f"https://www.instagram.com/{username}/"
+        url = f"{self.base_url}/{username}/"
         print(f"🔍 Fetching profile page: {url}")
         
         try:
@@ -63,29 +100,72 @@ class InstagramDownloader:
             print(f"❌ Error fetching profile: {e}")
             return None
     
-    def extract_json_data(self, html):
-        """Extract JSON data from Instagram page."""
-        # Instagram embeds data in a <script> tag
-        pattern = r'<script type="application/json" data-react-helmet="true">(.*?)</script>'
-        matches = re.findall(pattern, html, re.DOTALL)
+    def iter_json_blobs(self, html):
+        """
+        Yield every JSON object embedded in the page.
         
-        for match in matches:
+        Script bodies are located with str.find and window._sharedData is
+        decoded with JSONDecoder.raw_decode, so the scan is linear in the
+        page size (no backtracking regex over large pages).
+        """
+        # Instagram embeds data in <script type="application/json" ...> tags
+        pos = 0
+        while True:
+            start = html.find(JSON_SCRIPT_OPEN, pos)
+            if start == -1:
+                break
+            body_start = html.find('>', start) + 1
+            body_end = html.find('</script>', body_start)
+            if body_start == 0 or body_end == -1:
+                break
+            pos = body_end
             try:
-                data = json.loads(match)
-                return data
+                yield json.loads(html[body_start:body_end])
             except json.JSONDecodeError:
                 continue
         
-        # Alternative: Look for window._sharedData
-        pattern = r'window\._sharedData\s*=\s*({.*?});'
-        match = re.search(pattern, html)
-        if match:
-            try:
-                return json.loads(match.group(1))
-            except json.JSONDecodeError:
-                pass
-        
-        return None
+        # Alternative: Look for window._sharedData (older page layout)
+        start = html.find(SHARED_DATA_MARKER)
+        if start != -1:
+            brace = html.find('{', start)
+            if brace != -1:
+                try:
+                    yield JSON_DECODER.raw_decode(html, brace)[0]
+                except json.JSONDecodeError:
+                    pass
+    
+    def extract_json_data(self, html):
+        """Extract the first JSON data blob from Instagram page."""
+        return next(self.iter_json_blobs(html), None)
+    
+    def iter_media_nodes(self, data):
+        """Walk embedded JSON (without re-serializing it) and yield media nodes."""
+        stack = [data]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                if MEDIA_NODE_KEYS.intersection(node):
+                    yield node
+                stack.extend(value for value in node.values() if isinstance(value, (dict, list)))
+            elif isinstance(node, list):
+                stack.extend(value for value in node if isinstance(value, (dict, list)))
+    
+    def media_node_urls(self, node):
+        """Pick the image URLs of one media node, largest variant first."""
+        # GraphQL layout: display_resources sorted by size, plus display_url
+        resources = node.get('display_resources') or []
+        if resources:
+            largest = max(resources, key=lambda r: r.get('config_width', 0))
+            if largest.get('src'):
+                yield largest['src']
+        if node.get('display_url'):
+            yield node['display_url']
+        # API layout: image_versions2.candidates (largest first)
+        candidates = (node.get('image_versions2') or {}).get('candidates') or []
+        if candidates and candidates[0].get('url'):
+            yield candidates[0]['url']
+        if not resources and not node.get('display_url') and node.get('thumbnail_src'):
+            yield node['thumbnail_src']
     
     def get_image_urls(self, username):
         """Extract image URLs from Instagram profile."""
@@ -93,55 +173,163 @@ class InstagramDownloader:
         if not html:
             return []
         
-        # Try to extract JSON data
-        data = self.extract_json_data(html)
-        
         image_urls = []
         
-        # Method 1: Try to find image URLs in JSON
-        if data:
-            # Navigate through the JSON structure (Instagram's structure varies)
-            # This is a simplified approach
-            json_str = json.dumps(data)
-            # Look for image URLs
-            url_pattern = r'https://[^"]*\.(jpg|jpeg|png|webp)[^"]*'
-            urls = re.findall(url_pattern, json_str, re.IGNORECASE)
-            image_urls.extend([url for url in urls if 'instagram' in url.lower()])
-        
-        # Method 2: Direct regex search in HTML
-        # Look for img tags or background-image URLs
-        img_pattern = r'https://[^"\s]*\.(jpg|jpeg|png|webp)[^"\s]*'
-        html_urls = re.findall(img_pattern, html, re.IGNORECASE)
-        image_urls.extend([url for url in html_urls if 'instagram' in url.lower()])
-        
-        # Remove duplicates and filter
-        unique_urls = list(set(image_urls))
-        # Filter to only include actual image URLs (not thumbnails if possible)
-        filtered_urls = [url for url in unique_urls if any(x in url for x in ['/p/', '/scontent-', 'cdninstagram'])]
-        
-        return filtered_urls[:50]  # Limit to first 50 for safety
-    
-    def download_image(self, url, output_path):
-        """Download a single image."""
+        # Method 1: Walk the embedded JSON directly to media nodes
+        for data in self.iter_json_blobs(html):
+            for node in self.iter_media_nodes(data):
+                image_urls.extend(self.media_node_urls(node))
+        
+        # Method 2 (fallback): linear-time URL scan of the raw HTML
+        if not image_urls:
+            for match in HTML_URL_RE.finditer(html):
+                url = match.group(0).replace('\\/', '/').replace('\\u0026', '&').replace('&amp;', '&')
+                if looks_like_image(url):
+                    image_urls.append(url)
+        
+        # Remove duplicates, keep Instagram post images (not thumbnails) and add high-res variants
+        filtered_urls = sorted(normalize_image_urls(image_urls))
+        
+        return filtered_urls
+    
+    def fetch_json(self, path, params=None, session=None):
+        """GET a JSON endpoint relative to base_url (with self.session unless another session is given)."""
+        response = (session or self.session).get(
+            f"{self.base_url}{path}",
+            params=params,
+            headers={'Accept': 'application/json', 'X-IG-App-ID': IG_APP_ID, 'Referer': f"{self.base_url}/"},
+            timeout=30,
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    def find_timeline(self, data):
+        """
+        Find the user's post timeline in API/GraphQL JSON.
+        
+        Returns:
+            (user_id, edge_owner_to_timeline_media dict), or None if not present
+        """
+        stack = [data]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                timeline = node.get('edge_owner_to_timeline_media')
+                if isinstance(timeline, dict):
+                    return node.get('id'), timeline
+                stack.extend(value for value in node.values() if isinstance(value, (dict, list)))
+            elif isinstance(node, list):
+                stack.extend(value for value in node if isinstance(value, (dict, list)))
+        return None
+    
+    def fetch_first_page(self, username):
+        """Get (user_id, timeline) for the profile's first page, from the profile API or page HTML."""
         try:
-            # Update referer header
-            self.session.headers['Referer'] = 'https://www.instagram.com/'
-            
-            response = self.session.get(url, timeout=30, stream=True)
-            response.raise_for_status()
+            found = self.find_timeline(self.fetch_json('/api/v1/users/web_profile_info/', {'username': username}))
+            if found:
+                return found
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"⚠️  Profile API unavailable ({e}), falling back to page HTML")
+        
+        for data in self.iter_json_blobs(self.get_profile_page(username) or ''):
+            found = self.find_timeline(data)
+            if found:
+                return found
+        return None
+    
+    def fetch_timeline_page(self, user_id, cursor, session=None):
+        """Fetch the page of posts after cursor (runs in the prefetch thread, with its own session)."""
+        self.random_delay()
+        variables = json.dumps({'id': user_id, 'first': PAGE_SIZE, 'after': cursor}, separators=(',', ':'))
+        params = {'query_hash': GRAPHQL_QUERY_HASH, 'variables': variables}
+        found = self.find_timeline(self.fetch_json('/graphql/query/', params, session))
+        if not found:
+            raise ValueError("Unexpected pagination response (no timeline)")
+        return found[1]
+    
+    def iter_timeline_pages(self, username, checkpoint=None):
+        """
+        Yield (user_id, page, next_cursor) for each page of the profile's posts.
+        
+        The next page is requested in a background thread as soon as its cursor
+        is known, so it downloads while the caller handles the current page.
+        That thread uses its own copy of the session, because the caller keeps
+        downloading images with self.session at the same time.
+        
+        Args:
+            username: Instagram username
+            checkpoint: Saved checkpoint to resume from (skips pages already done)
+        """
+        with ThreadPoolExecutor(max_workers=1) as prefetch, self.clone_session() as page_session:
+            if checkpoint:
+                user_id = checkpoint['user_id']
+                print(f"↩️  Resuming after page {checkpoint['pages_done']}")
+                future = prefetch.submit(self.fetch_timeline_page, user_id, checkpoint['end_cursor'], page_session)
+            else:
+                found = self.fetch_first_page(username)
+                if not found or not found[0]:
+                    return
+                user_id, first_page = found
+                future = None
             
+            while True:
+                page = future.result() if future else first_page
+                page_info = page.get('page_info') or {}
+                cursor = page_info.get('end_cursor') if page_info.get('has_next_page') else None
+                future = prefetch.submit(self.fetch_timeline_page, user_id, cursor, page_session) if cursor else None
+                yield user_id, page, cursor
+                if future is None:
+                    break
+    
+    def page_posts(self, page):
+        """Yield (shortcode, [image URLs]) for each post on a timeline page, largest variant per image."""
+        for edge in page.get('edges') or []:
+            post = edge.get('node') or {}
+            urls = []
+            for node in self.iter_media_nodes(post):
+                url = next(self.media_node_urls(node), None)
+                if url and is_post_image(url):
+                    urls.append(url)
+            # A carousel's own display_url repeats its first child's image
+            urls = list(dict.fromkeys(urls))
+            if urls:
+                yield post.get('shortcode') or post.get('id') or 'post', urls
+    
+    def load_checkpoint(self, output_path, username):
+        """Load a pagination checkpoint for this profile, if any."""
+        try:
+            with open(output_path / CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return checkpoint if checkpoint.get('username') == username else None
+    
+    def save_checkpoint(self, output_path, checkpoint):
+        """Atomically write the pagination checkpoint."""
+        tmp_path = output_path / (CHECKPOINT_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f, indent=2)
+        tmp_path.replace(output_path / CHECKPOINT_FILE)
+    
+    def download_image(self, url, output_path, name=None):
+        """
+        Download a single image.
+        
+        Args:
+            url: Image URL
+            output_path: Directory to save to
+            name: File name without extension (default: derived from the URL).
+                  Existing files with this name are not downloaded again.
+        """
+        try:
             # Determine file extension
-            parsed = urlparse(url)
-            ext = Path(parsed.path).suffix or '.jpg'
-            if ext not in ['.jpg', '.jpeg', '.png', '.webp']:
-                ext = '.jpg'
-            
-            # Save image
-            filename = output_path / f"image_{hash(url) % 100000}{ext}"
-            with open(filename, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+            ext = image_extension(url)
+            filename = output_path / f"{name or f'image_{hash(url) % 100000}'}{ext}"
+            if name and filename.exists():
+                return filename
             
+            # Save image (written atomically, resumed if truncated)
+            download_file(self.session, url, filename, headers={'Referer': 'https://www.instagram.com/'})
             return filename
         except Exception as e:
             print(f"⚠️  Error downloading {url}: {e}")
@@ -187,23 +375,94 @@ class InstagramDownloader:
         
         print(f"\n✅ Download complete! {downloaded}/{len(image_urls)} images saved.")
         print(f"📁 Location: {output_path.absolute()}")
+    
+    def download_all_pages(self, username, output_dir=None):
+        """
+        Download every post by following the profile's pagination cursors.
+        
+        A checkpoint with the next cursor is saved after each page, so an
+        interrupted crawl resumes from where it stopped. The checkpoint never
+        moves past a page with failed images and is only removed once a crawl
+        finishes without failures, so running again retries them (with fresh
+        image URLs; files already saved are skipped).
+        """
+        if output_dir is None:
+            output_dir = f"./instagram_downloads/{username}"
+        
+        output_path = Path(output_dir)
+        output_path.mkdir(parents=True, exist_ok=True)
+        
+        print(f"📥 Downloading all pages from @{username}...")
+        print(f"💾 Saving to: {output_path.absolute()}")
+        
+        checkpoint = self.load_checkpoint(output_path, username)
+        pages_done = checkpoint['pages_done'] if checkpoint else 0
+        downloaded = 0
+        failed = 0
+        
+        try:
+            for user_id, page, next_cursor in self.iter_timeline_pages(username, checkpoint):
+                pages_done += 1
+                posts = list(self.page_posts(page))
+                print(f"📄 Page {pages_done}: {len(posts)} posts")
+                
+                for shortcode, urls in posts:
+                    for i, url in enumerate(urls):
+                        name = f"{shortcode}_{i}" if len(urls) > 1 else shortcode
+                        existed = any((output_path / f"{name}{ext}").exists() for ext in ('.jpg', '.jpeg', '.png', '.webp'))
+                        if self.download_image(url, output_path, name):
+                            downloaded += 0 if existed else 1
+                            if not existed:
+                                self.random_delay()
+                        else:
+                            failed += 1
+                
+                # After a failure the checkpoint stays on the page that had it
+                if next_cursor and not failed:
+                    self.save_checkpoint(output_path, {
+                        'username': username,
+                        'user_id': user_id,
+                        'end_cursor': next_cursor,
+                        'pages_done': pages_done,
+                    })
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"❌ Pagination stopped: {e}")
+            print("   Run again to resume from the last completed page.")
+            return
+        
+        if not failed:
+            (output_path / CHECKPOINT_FILE).unlink(missing_ok=True)
+        if pages_done == 0:
+            print("❌ No posts found. Instagram may have blocked the request or changed their structure.")
+            return
+        print(f"\n✅ Download complete! {downloaded} new images from {pages_done} pages ({failed} failed).")
+        if failed:
+            print("   Run again to retry the failed images.")
+        print(f"📁 Location: {output_path.absolute()}")
 
 
 def main():
     """Main function."""
     if len(sys.argv) < 2:
-        print("Usage: python instagram_downloader_manual.py <username> [output_dir]")
+        print("Usage: python instagram_downloader_manual.py <username> [output_dir] [--all-pages]")
+        print("\nOptions:")
+        print("  --all-pages   Follow pagination to get every post (resumable)")
         print("\nExample:")
         print("  python instagram_downloader_manual.py grapeot")
+        print("  python instagram_downloader_manual.py grapeot --all-pages")
         print("\n⚠️  WARNING: This method is more likely to be blocked.")
         print("   Use instagram_downloader.py (instaloader) for better results.")
         sys.exit(1)
     
     username = sys.argv[1].replace('@', '').replace('https://www.instagram.com/', '').rstrip('/')
-    output_dir = sys.argv[2] if len(sys.argv) > 2 else None
+    positional = [arg for arg in sys.argv[2:] if not arg.startswith('--')]
+    output_dir = positional[0] if positional else None
     
     downloader = InstagramDownloader(delay_min=3, delay_max=6)
-    downloader.download_all(username, output_dir)
+    if '--all-pages' in sys.argv:
+        downloader.download_all_pages(username, output_dir)
+    else:
+        downloader.download_all(username, output_dir)
 
 
 if __name__ == "__main__":
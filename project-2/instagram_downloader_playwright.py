@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+Playwright backend for the browser-based Instagram downloader.
+
+Same interface as InstagramBrowserDownloader (download_profile, wait_for_downloads,
+close), built on Playwright's async API instead of Selenium/ChromeDriver:
+- The browser is driven over Playwright's direct connection rather than one
+  WebDriver HTTP round trip per command
+- Image responses are intercepted as the page loads them, and their bodies are
+  saved straight from the browser (no second download)
+- Only harvested URLs the page never loaded (e.g. 1080px variants) are fetched
+  with requests afterwards
+
+Requires: pip install playwright && playwright install chromium
+
+Usage: python instagram_downloader_browser.py <username> --playwright [options]
+"""
+
+import asyncio
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Set
+
+import requests
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+
+from file_download import download_file, write_bytes
+from instagram_downloader_browser import (
+    BLOCKED_URL_PATTERNS, COLLECT_CANDIDATES_FN, SCROLL_OBSERVER_JS, SCROLL_STEP_JS, RateLimiter, StreamingDownloader,
+)
+from session_store import SessionStore
+from url_classifier import normalize_image_urls, image_extension, is_post_image
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# The shared scripts are written for Selenium (statements / a trailing callback
+# argument); wrap them as functions for page.evaluate
+SCROLL_OBSERVER_FN = "() => {" + SCROLL_OBSERVER_JS + "}"
+SCROLL_STEP_FN = "args => new Promise(done => (function () {" + SCROLL_STEP_JS + "}).apply(null, args.concat([done])))"
+COLLECT_ALL_CANDIDATES_FN = COLLECT_CANDIDATES_FN.strip()
+
+
+def _glob_to_js_regex(pattern: str) -> str:
+    """
+    Regex source for a '*' glob that both Python's re and JavaScript's RegExp accept.
+    
+    Playwright compiles route patterns in the Node driver, which rejects the
+    Python-only syntax fnmatch.translate() produces ((?s:...), \\Z, atomic groups).
+    """
+    parts = []
+    for char in pattern:
+        if char == '*':
+            parts.append('.*')
+        elif char in '\\^$.|?+()[]{}/':
+            parts.append('\\' + char)
+        else:
+            parts.append(char)
+    return '^' + ''.join(parts) + '$'
+
+
+# One route for all blocked patterns, so only matching requests reach Python
+BLOCKED_URL_RE = re.compile('|'.join(f'(?:{_glob_to_js_regex(pattern)})' for pattern in BLOCKED_URL_PATTERNS))
+
+
+class PlaywrightBrowserDownloader:
+    """Browser-based Instagram image downloader using Playwright (async API)."""
+    
+    def __init__(self, headless=False, use_existing_profile=False, profile_path=None, rate_limiter=None,
+                 session_store=None, block_resources=False):
+        """
+        Initialize the browser downloader.
+        
+        Args:
+            headless: Run browser in headless mode (no GUI)
+            use_existing_profile: Use existing Chrome profile (to use logged-in session)
+            profile_path: Path to Chrome user data directory (default: macOS Chrome location)
+            rate_limiter: Shared RateLimiter for image downloads (default: 2 downloads/second)
+            session_store: SessionStore used to persist and restore login cookies
+            block_resources: Abort videos, fonts and analytics requests (see BLOCKED_URL_PATTERNS)
+        """
+        self.headless = headless
+        self.block_resources = block_resources
+        self.blocked_count = 0
+        self.use_existing_profile = use_existing_profile
+        self.profile_path = profile_path
+        self.rate_limiter = rate_limiter or RateLimiter(2.0)
+        self.session_store = session_store or SessionStore()
+        # One event loop per downloader, kept between profiles so the browser can be reused
+        self.loop = None
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.page = None
+        self.output_path = None
+        self.image_urls: Set[str] = set()
+        self.saved_urls: Set[str] = set()
+        self.captures: List[asyncio.Task] = []
+        self.saved_count = 0
+        self.pending_downloads: List[StreamingDownloader] = []
+    
+    def _run(self, coro):
+        """Run a coroutine on this downloader's event loop."""
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+        return self.loop.run_until_complete(coro)
+    
+    async def setup_browser(self) -> bool:
+        """Launch Chromium and register the image response listener."""
+        args = ['--no-sandbox', '--disable-dev-shm-usage', '--disable-blink-features=AutomationControlled']
+        try:
+            self.playwright = await async_playwright().start()
+            if self.use_existing_profile:
+                # A persistent context reuses the logged-in Chrome profile (Chrome must be closed)
+                user_data_dir = self.profile_path or os.path.expanduser("~/Library/Application Support/Google/Chrome")
+                self.context = await self.playwright.chromium.launch_persistent_context(
+                    user_data_dir, channel='chrome', headless=self.headless, args=args, user_agent=USER_AGENT,
+                )
+            else:
+                self.browser = await self.playwright.chromium.launch(headless=self.headless, args=args)
+                self.context = await self.browser.new_context(user_agent=USER_AGENT)
+                await self.restore_cookies()
+            
+            await self.context.add_init_script('Object.defineProperty(navigator, "webdriver", {get: () => undefined})')
+            self.context.on('response', self.on_response)
+            if self.block_resources:
+                await self.context.route(BLOCKED_URL_RE, self.abort_request)
+                print(f"🚫 Blocking videos, fonts and analytics ({len(BLOCKED_URL_PATTERNS)} URL patterns)")
+            self.page = self.context.pages[0] if self.context.pages else await self.context.new_page()
+            print("✅ Browser initialized successfully (Playwright)")
+            return True
+        except Exception as e:
+            print(f"❌ Error setting up browser: {e}")
+            print("   Make sure Playwright and its Chromium build are installed:")
+            print("   pip install playwright && playwright install chromium")
+            await self._close()
+            return False
+    
+    async def abort_request(self, route):
+        """Abort a request matching BLOCKED_URL_RE."""
+        self.blocked_count += 1
+        await route.abort('blockedbyclient')
+    
+    def on_response(self, response):
+        """Capture every post image the browser receives (runs on the event loop)."""
+        if self.output_path is None or response.request.resource_type != 'image':
+            return
+        url = response.url
+        if url in self.saved_urls or not is_post_image(url):
+            return
+        self.saved_urls.add(url)
+        self.captures.append(asyncio.ensure_future(self.save_response(response)))
+    
+    async def save_response(self, response) -> bool:
+        """Save an intercepted image response's body straight to disk."""
+        url = response.url
+        try:
+            if not response.ok:
+                raise ValueError(f"HTTP {response.status}")
+            body = await response.body()
+        except Exception:
+            # Not available from the browser; it will be downloaded with requests instead
+            self.saved_urls.discard(url)
+            return False
+        
+        self.saved_count += 1
+        path = self.output_path / f"image_{self.saved_count:04d}{image_extension(url)}"
+        try:
+            await self.loop.run_in_executor(None, write_bytes, body, path)
+        except OSError as e:
+            print(f"\n   ⚠️  Failed to save {url}: {e}")
+            self.saved_urls.discard(url)
+            return False
+        self.image_urls.add(url)
+        return True
+    
+    def harvest_urls(self, candidates) -> int:
+        """
+        Record new image URLs.
+        
+        Returns:
+            Number of previously unseen image URLs
+        """
+        new_urls = normalize_image_urls(candidates) - self.image_urls
+        self.image_urls.update(new_urls)
+        return len(new_urls)
+    
+    async def scroll_to_load_all(self, max_scrolls=200, idle_ms=800, max_wait=10.0, stall_limit=4):
+        """
+        Scroll through the profile until no new content loads.
+        
+        Same settle-on-activity logic as InstagramBrowserDownloader.scroll_to_load_all;
+        image responses are captured by on_response while scrolling.
+        
+        Args:
+            max_scrolls: Maximum number of scroll attempts
+            idle_ms: Quiet period (milliseconds) after which the page counts as settled
+            max_wait: Maximum time to wait for a single scroll to settle (seconds)
+            stall_limit: Stop after this many settled scrolls at the bottom with no new content
+        """
+        print("📜 Scrolling to load all images...")
+        
+        await self.page.evaluate(SCROLL_OBSERVER_FN)
+        wait_ms = int(max_wait * 1000)
+        
+        last_height = await self.page.evaluate("document.body.scrollHeight")
+        scroll_count = 0
+        last_image_count = 0
+        consecutive_no_change = 0
+        started = time.time()
+        
+        while scroll_count < max_scrolls:
+            mode = 'bottom' if scroll_count % 5 == 0 else 'step'
+            state = await self.page.evaluate(SCROLL_STEP_FN, [mode, idle_ms, wait_ms])
+            self.harvest_urls(state['urls'])
+            
+            new_height = state['height']
+            current_images = state['articles']
+            at_bottom = state['offset'] >= state['height'] - state['viewport'] - 100  # Within 100px of bottom
+            
+            if new_height == last_height and not state['activity']:
+                consecutive_no_change += 1
+                if at_bottom and consecutive_no_change >= stall_limit:
+                    print(f"   ✅ Reached end of page after {scroll_count + 1} scrolls")
+                    break
+            else:
+                consecutive_no_change = 0
+                if current_images > last_image_count:
+                    print(f"   📜 Scrolled {scroll_count + 1} times, found {current_images} posts so far...")
+                    last_image_count = current_images
+                elif scroll_count % 15 == 0:
+                    print(f"   📜 Scrolled {scroll_count + 1} times, page height: {new_height}px...")
+            
+            last_height = new_height
+            scroll_count += 1
+        
+        print("   🔄 Final scroll to ensure all content is loaded...")
+        for mode in ('bottom', 'rewind', 'bottom'):
+            state = await self.page.evaluate(SCROLL_STEP_FN, [mode, idle_ms, wait_ms])
+            self.harvest_urls(state['urls'])
+        
+        elapsed = time.time() - started
+        print(f"✅ Finished scrolling ({scroll_count} scrolls in {elapsed:.1f}s, final page height: {state['height']}px)")
+        print(f"   📸 Harvested {len(self.image_urls)} image URLs, intercepted {len(self.captures)} image responses")
+        if self.block_resources:
+            print(f"   🚫 Blocked {self.blocked_count} unneeded requests")
+    
+    async def restore_cookies(self) -> bool:
+        """Load saved login cookies into the fresh browser context."""
+        cookies = self.session_store.load_cookies()
+        if not cookies:
+            return False
+        params = []
+        for cookie in cookies:
+            param = {
+                'name': cookie['name'],
+                'value': cookie['value'],
+                'domain': cookie.get('domain', '.instagram.com'),
+                'path': cookie.get('path', '/'),
+                'secure': cookie.get('secure', False),
+                'httpOnly': cookie.get('httpOnly', False),
+            }
+            if cookie.get('expiry'):
+                param['expires'] = cookie['expiry']
+            if cookie.get('sameSite') in ('Strict', 'Lax', 'None'):
+                param['sameSite'] = cookie['sameSite']
+            params.append(param)
+        try:
+            await self.context.add_cookies(params)
+        except Exception as e:
+            print(f"⚠️  Could not restore saved cookies: {e}")
+            return False
+        print("🍪 Restored saved Instagram login cookies")
+        return True
+    
+    async def get_cookies(self) -> List[Dict]:
+        """Browser cookies in the Selenium format used by SessionStore."""
+        cookies = []
+        for cookie in await self.context.cookies():
+            converted = {key: cookie[key] for key in ('name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'sameSite')
+                         if key in cookie}
+            if cookie.get('expires', -1) > 0:
+                converted['expiry'] = int(cookie['expires'])
+            cookies.append(converted)
+        return cookies
+    
+    async def create_session(self) -> requests.Session:
+        """requests session carrying the browser's cookies, for URLs the page never loaded."""
+        session = requests.Session()
+        for cookie in await self.get_cookies():
+            session.cookies.set(cookie['name'], cookie['value'])
+        session.headers.update({'User-Agent': USER_AGENT, 'Referer': 'https://www.instagram.com/'})
+        return session
+    
+    def download_image(self, session: requests.Session, url: str, output_dir: Path, index: int) -> bool:
+        """Download a single image as image_{index}. Returns True on success."""
+        try:
+            download_file(session, url, output_dir / f"image_{index:04d}{image_extension(url)}")
+            return True
+        except Exception as e:
+            print(f"\n   ⚠️  Failed to download {url}: {e}")
+            return False
+    
+    async def download_remaining(self, output_path: Path, wait=True) -> int:
+        """
+        Download harvested URLs that the browser did not deliver itself.
+        
+        Args:
+            output_path: Directory the images are saved to
+            wait: Block until done; otherwise keep downloading in the background (see wait_for_downloads)
+        
+        Returns:
+            Number of images downloaded (0 when not waiting)
+        """
+        remaining = sorted(self.image_urls - self.saved_urls)
+        if not remaining:
+            return 0
+        
+        print(f"\n📥 Downloading {len(remaining)} images the page did not load itself...")
+        streamer = StreamingDownloader(
+            self.download_image,
+            await self.create_session(),
+            output_path,
+            self.rate_limiter,
+            first_index=self.saved_count + 1,
+        )
+        for url in remaining:
+            streamer.put(url)
+        streamer.close()
+        if not wait:
+            self.pending_downloads.append(streamer)
+            return 0
+        return await self.loop.run_in_executor(None, streamer.join)
+    
+    def wait_for_downloads(self) -> int:
+        """Wait for downloads left running by download_profile(wait_for_downloads=False)."""
+        downloaded = 0
+        while self.pending_downloads:
+            downloaded += self.pending_downloads.pop(0).join()
+        return downloaded
+    
+    async def _close(self):
+        if self.context is not None:
+            await self.context.close()
+        if self.browser is not None:
+            await self.browser.close()
+        if self.playwright is not None:
+            await self.playwright.stop()
+            print("🔒 Browser closed")
+        self.playwright = self.browser = self.context = self.page = None
+    
+    def close(self):
+        """Quit the browser."""
+        if self.loop is None:
+            return
+        self._run(self._close())
+        self.loop.close()
+        self.loop = None
+    
+    def download_profile(self, username: str, output_dir: str = None, keep_browser_open=False, wait_for_downloads=True):
+        """
+        Main method to download all images from an Instagram profile.
+        
+        Args:
+            username: Instagram username (without @)
+            output_dir: Output directory for images
+            keep_browser_open: Leave the browser running so the next profile can reuse it
+            wait_for_downloads: Block until this profile's downloads finish. When False they
+                                continue in the background while the next profile scrolls.
+        """
+        return self._run(self._download_profile(username, output_dir, keep_browser_open, wait_for_downloads))
+    
+    async def _download_profile(self, username, output_dir, keep_browser_open, wait_for_downloads):
+        if output_dir is None:
+            output_dir = f"./instagram_downloads/{username}"
+        
+        # Reset per-profile state (the browser itself may be reused)
+        self.image_urls = set()
+        self.saved_urls = set()
+        self.captures = []
+        self.saved_count = 0
+        self.blocked_count = 0
+        self.output_path = None
+        
+        if self.context is None and not await self.setup_browser():
+            return False
+        
+        output_path = Path(output_dir)
+        output_path.mkdir(parents=True, exist_ok=True)
+        try:
+            # Image responses are saved from here on
+            self.output_path = output_path
+            
+            url = f"https://www.instagram.com/{username}/"
+            print(f"🌐 Navigating to {url}...")
+            await self.page.goto(url, wait_until='domcontentloaded')
+            
+            print("⏳ Waiting for page to load...")
+            try:
+                await self.page.wait_for_selector('article', timeout=15000)
+                print("✅ Page loaded successfully")
+            except PlaywrightTimeoutError:
+                print("⚠️  Timeout waiting for content, continuing anyway...")
+                if await self.page.locator("text=/Log in|Sign up/").count():
+                    print("⚠️  Instagram may be asking for login. Try using --use-existing-profile")
+                    print("   (Make sure Chrome is closed first)")
+            
+            if "instagram.com" not in self.page.url:
+                print("❌ Failed to load Instagram page")
+                return False
+            
+            # Keep the (possibly refreshed) login so later runs can skip logging in
+            try:
+                if self.session_store.save_cookies(await self.get_cookies()):
+                    print("🍪 Saved login cookies for reuse")
+            except Exception as e:
+                print(f"⚠️  Could not save cookies: {e}")
+            
+            await self.scroll_to_load_all(max_scrolls=200)
+            
+            # Final sweep for anything the scroll harvest missed
+            candidates = await self.page.evaluate(COLLECT_ALL_CANDIDATES_FN) or []
+            self.harvest_urls(candidates)
+            
+            # Let in-flight captures finish before deciding what still needs downloading
+            await asyncio.gather(*self.captures)
+            self.output_path = None
+            saved = sum(1 for task in self.captures if task.result())
+            print(f"\n📸 Found {len(self.image_urls)} unique image URLs ({saved} saved straight from the browser)")
+            
+            if not self.image_urls:
+                print("❌ No images found. The account might be private or the page structure changed.")
+                return False
+            
+            await self.download_remaining(output_path, wait=wait_for_downloads)
+            
+            if wait_for_downloads:
+                print(f"\n✅ Complete! Images saved to: {output_path.absolute()}")
+            else:
+                print(f"\n✅ Finished scrolling @{username}; downloads continue in the background")
+            return True
+        
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            return False
+        finally:
+            self.output_path = None
+            if not keep_browser_open:
+                await self._close()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Archive Optimizer for downloaded Instagram images.
+
+Post-download stage for the instagram_downloads/<username>/ directories:
+1. Decodes each new image once in a process pool
+2. Computes a perceptual hash (dHash) plus dimensions and file size
+3. Optionally transcodes to a target format/quality (kept only if smaller)
+4. Finds near-duplicates (e.g. downscaled copies) and optionally replaces them
+   with hard links to the best copy
+5. Writes a compact index (.image_index.json) per directory
+
+File names never change: transcoded images keep their original name and
+extension, and deduplicated names stay in place as links, so the downloaders
+(which skip posts whose files exist) don't download them again.
+
+Incremental: files whose size and modification time match the index are not
+decoded again, so reruns only touch new or changed files. Files that can't be
+decoded are indexed as failed and not retried until they change.
+
+Usage: python optimize_archive.py <dir> [<dir> ...] [options]
+"""
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+INDEX_FILE = ".image_index.json"
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+TARGET_FORMATS = ('jpeg', 'webp', 'png')
+
+# dHash compares neighbouring pixels of a (HASH_SIZE + 1) x HASH_SIZE thumbnail
+HASH_SIZE = 8
+
+
+def dhash(img) -> int:
+    """64-bit difference hash: robust to rescaling and recompression."""
+    small = img.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def process_image(path, target_format=None, quality=85):
+    """
+    Decode one image and return its index record (runs in a worker process).
+    
+    When transcoding, the new file replaces the original (under the same name)
+    only if it is smaller; the record notes the attempt either way so reruns
+    don't retry it.
+    
+    Returns:
+        (file name, record dict), or (file name, None) if the file can't be decoded
+    """
+    path = Path(path)
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+            image_format = (img.format or '').lower()
+            if target_format and image_format != target_format:
+                img.load()
+                image_hash = dhash(img)
+                if transcode(img, path, target_format, quality):
+                    image_format = target_format
+            else:
+                # Only the hash is needed: let the JPEG decoder downscale while decoding
+                img.draft('RGB', (64, 64))
+                image_hash = dhash(img)
+    except Exception:
+        return path.name, None
+    
+    stat = path.stat()
+    record = {
+        'fmt': image_format,
+        'w': width,
+        'h': height,
+        'hash': f"{image_hash:016x}",
+        'size': stat.st_size,
+        'mtime': int(stat.st_mtime),
+    }
+    if target_format:
+        record['tried'] = target_format
+    return path.name, record
+
+
+def transcode(img, path: Path, target_format, quality):
+    """
+    Re-encode img and replace path with it if the result is smaller.
+    
+    The file keeps its name and extension (decoders go by the content, not the
+    extension), because the downloaders decide whether a post is already
+    archived by its file name.
+    
+    Returns:
+        True if the re-encoded file was kept
+    """
+    tmp = path.with_name(path.name + '.tmp')
+    out = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'P') and target_format != 'jpeg' else 'RGB')
+    out.save(tmp, format=target_format.upper(), quality=quality, optimize=True)
+    
+    if tmp.stat().st_size < path.stat().st_size:
+        os.replace(tmp, path)
+        return True
+    tmp.unlink()
+    return False
+
+
+def load_index(directory: Path):
+    """Load a directory's index ({file name: record})."""
+    try:
+        with open(directory / INDEX_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f).get('images', {})
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_index(directory: Path, images):
+    """Write the index compactly and atomically."""
+    tmp = directory / (INDEX_FILE + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'version': 1, 'images': images}, f, separators=(',', ':'), sort_keys=True)
+    os.replace(tmp, directory / INDEX_FILE)
+
+
+def link_duplicate(directory: Path, keep, name):
+    """
+    Replace a redundant copy with a hard link to the kept file.
+    
+    The name stays in the directory, so the post isn't downloaded again, but
+    its data is shared with the kept copy.
+    
+    Returns:
+        True if the copy was replaced
+    """
+    tmp = directory / (name + '.tmp')
+    try:
+        os.link(directory / keep, tmp)
+        os.replace(tmp, directory / name)
+        return True
+    except OSError:
+        tmp.unlink(missing_ok=True)
+        return False
+
+
+def find_duplicates(images, max_distance=4):
+    """
+    Group near-duplicate images by dHash Hamming distance.
+    
+    Hashes are split into max_distance + 1 bands; two hashes within
+    max_distance bits must share at least one band exactly, so only images
+    sharing a band are compared (instead of all pairs). Failed files and
+    names that are already links to a kept copy are left out.
+    
+    Returns:
+        List of groups (lists of file names), best copy first (most pixels, then largest file)
+    """
+    names = [name for name, record in images.items() if 'hash' in record and 'dup_of' not in record]
+    hashes = [int(images[name]['hash'], 16) for name in names]
+    bands = max_distance + 1
+    band_bits = -(-64 // bands)
+    mask = (1 << band_bits) - 1
+    
+    parent = list(range(len(names)))
+    
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    for band in range(bands):
+        buckets = {}
+        shift = band * band_bits
+        for i, value in enumerate(hashes):
+            buckets.setdefault((value >> shift) & mask, []).append(i)
+        for members in buckets.values():
+            for a in range(len(members)):
+                for b in range(a + 1, len(members)):
+                    i, j = members[a], members[b]
+                    if find(i) != find(j) and bin(hashes[i] ^ hashes[j]).count('1') <= max_distance:
+                        parent[find(i)] = find(j)
+    
+    groups = {}
+    for i, name in enumerate(names):
+        groups.setdefault(find(i), []).append(name)
+    
+    def quality(name):
+        record = images[name]
+        return (record['w'] * record['h'], record['size'])
+    
+    return [sorted(group, key=quality, reverse=True) for group in groups.values() if len(group) > 1]
+
+
+def optimize_directory(directory: Path, target_format=None, quality=85, dedupe=False,
+                       max_distance=4, workers=None):
+    """
+    Index (and optionally transcode/deduplicate) one directory of images.
+    
+    Args:
+        directory: Directory of downloaded images
+        target_format: 'jpeg', 'webp' or 'png' to transcode to, or None to keep formats
+        quality: Encoder quality for transcoding
+        dedupe: Replace near-duplicates with hard links to the best copy (otherwise they are only reported)
+        max_distance: Max dHash Hamming distance for near-duplicates
+        workers: Process pool size (default: CPU count)
+    """
+    print(f"\n📁 {directory}")
+    started = time.time()
+    index = load_index(directory)
+    
+    # Single listing of the directory; unchanged files are skipped
+    current = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                stat = entry.stat()
+                current[entry.name] = (stat.st_size, int(stat.st_mtime))
+    
+    # Links whose kept copy is gone are indexed again as ordinary files
+    images = {name: record for name, record in index.items()
+              if name in current and (record['size'], record['mtime']) == current[name]
+              and record.get('dup_of', name) in current
+              and (not target_format or 'failed' in record or 'dup_of' in record
+                   or record.get('tried') == target_format or record.get('fmt') == target_format)}
+    pending = [directory / name for name in current if name not in images]
+    print(f"   {len(current)} images, {len(pending)} new or changed")
+    
+    bytes_before = sum(current[path.name][0] for path in pending)
+    bytes_after = 0
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(process_image, str(path), target_format, quality) for path in pending]
+            for future in futures:
+                name, record = future.result()
+                if record is None:
+                    # Indexed as failed, so it isn't decoded again until it changes
+                    size, mtime = current[name]
+                    images[name] = {'failed': True, 'size': size, 'mtime': mtime}
+                    print(f"   ⚠️  Could not decode {name}")
+                else:
+                    images[name] = record
+                    bytes_after += record['size']
+    if target_format and bytes_after:
+        print(f"   🗜️  Transcoded to {target_format}: {bytes_before / 1e6:.1f} MB -> {bytes_after / 1e6:.1f} MB")
+    
+    groups = find_duplicates(images, max_distance)
+    removable = [name for group in groups for name in group[1:]]
+    if groups:
+        print(f"   🔁 {len(groups)} near-duplicate groups ({len(removable)} redundant files)")
+        if not dedupe:
+            for group in groups[:10]:
+                print(f"      keep {group[0]}, duplicates: {', '.join(group[1:])}")
+            print("      (use --dedupe to replace them with links)")
+    if dedupe:
+        freed = 0
+        linked = 0
+        for group in groups:
+            keep = group[0]
+            for name in group[1:]:
+                if link_duplicate(directory, keep, name):
+                    freed += images[name]['size']
+                    linked += 1
+                    images[name] = dict(images[keep], dup_of=keep)
+        # Earlier links stop sharing data once their kept copy is transcoded
+        for name, record in images.items():
+            keep = record.get('dup_of')
+            if (keep in images and not (directory / keep).samefile(directory / name)
+                    and link_duplicate(directory, keep, name)):
+                freed += record['size']
+                linked += 1
+                images[name] = dict(images[keep], dup_of=keep)
+        if linked:
+            print(f"   🔗 Linked {linked} duplicates to their best copy, freed {freed / 1e6:.1f} MB")
+    
+    save_index(directory, images)
+    failed = sum(1 for record in images.values() if 'failed' in record)
+    print(f"   ✅ Indexed {len(images)} images in {time.time() - started:.1f}s ({failed} failed)")
+
+
+def main():
+    """Main function."""
+    if len(sys.argv) < 2:
+        print("Usage: python optimize_archive.py <dir> [<dir> ...] [options]")
+        print("\nOptions:")
+        print("  --format FMT      Transcode to jpeg, webp or png (kept only if smaller)")
+        print("  --quality N       Encoder quality for transcoding (default: 85)")
+        print("  --dedupe          Replace near-duplicates with hard links to the highest-resolution copy")
+        print("  --distance N      Max perceptual-hash distance for near-duplicates (default: 4)")
+        print("  --workers N       Worker processes (default: CPU count)")
+        print("\nExample:")
+        print("  python optimize_archive.py instagram_downloads/grapeot")
+        print("  python optimize_archive.py instagram_downloads/* --format webp --quality 80 --dedupe")
+        sys.exit(1)
+    
+    target_format = None
+    quality = 85
+    dedupe = '--dedupe' in sys.argv
+    max_distance = 4
+    workers = None
+    directories = []
+    
+    i = 1
+    while i < len(sys.argv):
+        if sys.argv[i] == '--format' and i + 1 < len(sys.argv):
+            target_format = sys.argv[i + 1].lower().replace('jpg', 'jpeg')
+            i += 2
+        elif sys.argv[i] == '--quality' and i + 1 < len(sys.argv):
+            quality = int(sys.argv[i + 1])
+            i += 2
+        elif sys.argv[i] == '--distance' and i + 1 < len(sys.argv):
+            max_distance = int(sys.argv[i + 1])
+            i += 2
+        elif sys.argv[i] == '--workers' and i + 1 < len(sys.argv):
+            workers = int(sys.argv[i + 1])
+            i += 2
+        elif not sys.argv[i].startswith('--'):
+            directories.append(Path(sys.argv[i]))
+            i += 1
+        else:
+            i += 1
+    
+    if target_format and target_format not in TARGET_FORMATS:
+        print(f"❌ Unsupported format: {target_format} (use jpeg, webp or png)")
+        sys.exit(1)
+    
+    for directory in directories:
+        if not directory.is_dir():
+            print(f"⚠️  Skipping {directory}: not a directory")
+            continue
+        optimize_directory(directory, target_format, quality, dedupe, max_distance, workers)
+
+
+if __name__ == "__main__":
+    main()
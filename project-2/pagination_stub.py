@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Local stub of Instagram's profile pagination, for checking the manual
+downloader's --all-pages mode without touching Instagram.
+
+The stub replays timeline pages (the edge_owner_to_timeline_media objects of
+recorded web_profile_info / GraphQL responses), serves the first one from
+/api/v1/users/web_profile_info/ and the following ones from /graphql/query/
+by end_cursor, and answers image requests with small JPEG bodies. Image URLs
+are http://scontent.cdninstagram.com/... so they pass the URL classifier;
+the check routes them to the stub by using it as the session's HTTP proxy.
+
+Usage:
+    python pagination_stub.py [pages.json]               # resume checks (exit 1 on failure)
+    python pagination_stub.py [pages.json] --serve PORT  # just serve the pages
+
+pages.json is a JSON list of recorded timeline pages; without it, a few
+synthetic pages are generated.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from instagram_downloader_manual import CHECKPOINT_FILE, InstagramDownloader
+from session_store import SessionStore
+
+USER_ID = '1234567890'
+IMAGE_HOST = 'http://scontent.cdninstagram.com'
+
+
+def synthetic_pages(count=3, posts_per_page=4):
+    """Timeline pages in GraphQL layout, chained by end_cursor."""
+    pages = []
+    for page in range(count):
+        edges = []
+        for post in range(posts_per_page):
+            shortcode = f"P{page}x{post}"
+            edges.append({'node': {
+                'id': f"{page}{post}",
+                'shortcode': shortcode,
+                'display_url': f"{IMAGE_HOST}/v/t51.2885-15/s1080x1080/{shortcode}_n.jpg",
+            }})
+        has_next = page + 1 < count
+        pages.append({
+            'count': count * posts_per_page,
+            'page_info': {'has_next_page': has_next, 'end_cursor': f"cursor{page + 1}" if has_next else None},
+            'edges': edges,
+        })
+    return pages
+
+
+class StubInstagram:
+    """Threaded HTTP server replaying timeline pages, with injectable failures."""
+    
+    def __init__(self, pages, port=0):
+        """
+        Args:
+            pages: Timeline pages in order (each with page_info and edges)
+            port: Port to listen on (default: any free port)
+        """
+        self.first_page = pages[0]
+        # Each later page is requested with the end_cursor of the page before it
+        self.pages_by_cursor = {
+            previous['page_info']['end_cursor']: page for previous, page in zip(pages, pages[1:])
+        }
+        self.requests = Counter()
+        self.fail_cursors = set()  # Cursors answered once with a 500, then served normally
+        self.fail_images = set()  # Image paths answered once with a 500, then served normally
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+    
+    def _handler(self):
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                # As a proxy the stub receives absolute URLs, as an origin plain paths
+                url = urlsplit(self.path)
+                query = parse_qs(url.query)
+                if url.path == '/api/v1/users/web_profile_info/':
+                    stub.count('profile')
+                    self.send_json({'data': {'user': {'id': USER_ID, 'edge_owner_to_timeline_media': stub.first_page}}})
+                elif url.path == '/graphql/query/':
+                    cursor = json.loads(query['variables'][0]).get('after')
+                    stub.count(f"page:{cursor}")
+                    with stub.lock:
+                        fail = cursor in stub.fail_cursors
+                        stub.fail_cursors.discard(cursor)
+                    if fail or cursor not in stub.pages_by_cursor:
+                        self.send_error(500 if fail else 404)
+                        return
+                    timeline = stub.pages_by_cursor[cursor]
+                    self.send_json({'data': {'user': {'id': USER_ID, 'edge_owner_to_timeline_media': timeline}}})
+                elif url.path.endswith(('.jpg', '.jpeg', '.png', '.webp')):
+                    stub.count('image')
+                    with stub.lock:
+                        fail = url.path in stub.fail_images
+                        stub.fail_images.discard(url.path)
+                    if fail:
+                        self.send_error(500)
+                        return
+                    self.send_body(b'\xff\xd8\xff\xe0' + os.urandom(2048), 'image/jpeg')
+                else:
+                    self.send_error(404)
+            
+            def send_json(self, data):
+                self.send_body(json.dumps(data).encode(), 'application/json')
+            
+            def send_body(self, body, content_type):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, *args):
+                pass
+        
+        return Handler
+    
+    def count(self, key):
+        with self.lock:
+            self.requests[key] += 1
+    
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+    
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def make_downloader(stub, session_dir):
+    """Downloader without delays or saved cookies that sends everything to the stub."""
+    downloader = InstagramDownloader(delay_min=0, delay_max=0, session_store=SessionStore(session_dir),
+                                     base_url=stub.url)
+    downloader.session.proxies['http'] = stub.url
+    return downloader
+
+
+def check_resume(pages):
+    """
+    Crawl the stub with a failure injected before the last page, then resume.
+    
+    Returns:
+        List of failed checks (empty if everything worked)
+    """
+    problems = []
+    stub = StubInstagram(pages).start()
+    cursors = [page['page_info']['end_cursor'] for page in pages[:-1]]
+    expected = sum(1 for page in pages for _ in page['edges'])
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output = Path(tmp_dir) / 'out'
+            session_dir = Path(tmp_dir) / 'sessions'
+            
+            if cursors:
+                stub.fail_cursors.add(cursors[-1])
+            print(f"📊 Crawl 1: {len(pages)} pages, a 500 error injected before the last page")
+            make_downloader(stub, session_dir).download_all_pages('stubuser', output)
+            checkpoint_path = output / CHECKPOINT_FILE
+            if cursors:
+                if not checkpoint_path.exists():
+                    problems.append("no checkpoint saved after the interrupted crawl")
+                elif json.loads(checkpoint_path.read_text())['end_cursor'] != cursors[-1]:
+                    problems.append("checkpoint does not point at the failed page")
+            
+            print("\n📊 Crawl 2: resuming from the checkpoint")
+            make_downloader(stub, session_dir).download_all_pages('stubuser', output)
+            saved = [path for path in output.iterdir() if path.suffix == '.jpg']
+            if len(saved) != expected:
+                problems.append(f"{len(saved)} images saved, expected {expected}")
+            if checkpoint_path.exists():
+                problems.append("checkpoint left behind after a complete crawl")
+            if stub.requests['profile'] != 1:
+                problems.append(f"first page requested {stub.requests['profile']} times, expected once")
+            for cursor in cursors[:-1]:
+                if stub.requests[f"page:{cursor}"] != 1:
+                    problems.append(f"page after {cursor} requested {stub.requests[f'page:{cursor}']} times, expected once")
+            if stub.requests['image'] != expected:
+                problems.append(f"{stub.requests['image']} image requests, expected {expected}")
+    finally:
+        stub.stop()
+    return problems
+
+
+def check_failed_images(pages):
+    """
+    Crawl the stub with one image on the second page failing once, then run again.
+    
+    Returns:
+        List of failed checks (empty if everything worked)
+    """
+    problems = []
+    if len(pages) < 2:
+        return problems
+    stub = StubInstagram(pages).start()
+    cursor = pages[0]['page_info']['end_cursor']
+    expected = sum(1 for page in pages for _ in page['edges'])
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output = Path(tmp_dir) / 'out'
+            session_dir = Path(tmp_dir) / 'sessions'
+            downloader = make_downloader(stub, session_dir)
+            _, urls = next(downloader.page_posts(pages[1]))
+            stub.fail_images.add(urlsplit(urls[0]).path)
+            
+            print("\n📊 Crawl 3: one image on page 2 fails")
+            downloader.download_all_pages('stubuser', output)
+            checkpoint_path = output / CHECKPOINT_FILE
+            if not checkpoint_path.exists():
+                problems.append("checkpoint removed although an image failed")
+            elif json.loads(checkpoint_path.read_text())['end_cursor'] != cursor:
+                problems.append("checkpoint moved past the page with the failed image")
+            
+            print("\n📊 Crawl 4: retrying the failed image")
+            make_downloader(stub, session_dir).download_all_pages('stubuser', output)
+            saved = [path for path in output.iterdir() if path.suffix == '.jpg']
+            if len(saved) != expected:
+                problems.append(f"{len(saved)} images saved after the retry, expected {expected}")
+            if checkpoint_path.exists():
+                problems.append("checkpoint left behind after the failed image was retried")
+            if stub.requests['image'] != expected + 1:
+                problems.append(f"{stub.requests['image']} image requests, expected {expected + 1}")
+    finally:
+        stub.stop()
+    return problems
+
+
+def main():
+    """Main function."""
+    args = sys.argv[1:]
+    port = None
+    if '--serve' in args:
+        index = args.index('--serve')
+        port = int(args[index + 1])
+        del args[index:index + 2]
+    if args:
+        with open(args[0], 'r', encoding='utf-8') as f:
+            pages = json.load(f)
+    else:
+        pages = synthetic_pages()
+    
+    if port is not None:
+        stub = StubInstagram(pages, port)
+        print(f"🌐 Serving {len(pages)} pages at {stub.url} (use it as base_url and as the HTTP proxy)")
+        stub.server.serve_forever()
+        return
+    
+    problems = check_resume(pages) + check_failed_images(pages)
+    if problems:
+        print("\n❌ Resume check failed:")
+        for problem in problems:
+            print(f"   {problem}")
+        sys.exit(1)
+    print("\n✅ Resume check passed: the interrupted crawl resumed from its checkpoint without refetching pages,")
+    print("   and a failed image kept the checkpoint until it was retried")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,9 +15,11 @@ import json
 import sys
 import requests
 from pathlib import Path
-from urllib.parse import urlparse
 from typing import Set
 
+from file_download import download_file
+from url_classifier import normalize_image_urls, image_extension
+
 
 def extract_image_urls_from_har(har_file: str) -> Set[str]:
     """Extract Instagram image URLs from HAR file."""
@@ -26,7 +28,7 @@ def extract_image_urls_from_har(har_file: str) -> Set[str]:
     with open(har_file, 'r', encoding='utf-8') as f:
         har_data = json.load(f)
     
-    image_urls = set()
+    candidates = []
     
     # HAR structure: har -> log -> entries -> request/response
     entries = har_data.get('log', {}).get('entries', [])
@@ -53,24 +55,11 @@ def extract_image_urls_from_har(har_file: str) -> Set[str]:
                     break
         
         # Check if it's an image
-        is_image = 'image' in mime_type.lower() if mime_type else False
-        is_instagram = 'instagram.com' in url or 'cdninstagram.com' in url
-        
-        if is_image and is_instagram:
-            # Skip thumbnails, avatars, icons
-            if any(skip in url.lower() for skip in ['/s150x150/', '/s50x50/', 'avatar', 'profile_pic', 'icon']):
-                continue
-            
-            # Prefer high-resolution images
-            # Try to get original resolution
-            if '/s640x640/' in url:
-                original = url.replace('/s640x640/', '/s1080x1080/')
-                image_urls.add(original)
-            elif '/s480x480/' in url:
-                original = url.replace('/s480x480/', '/s1080x1080/')
-                image_urls.add(original)
-            
-            image_urls.add(url)
+        if mime_type and 'image' in mime_type.lower():
+            candidates.append(url)
+    
+    # Keep Instagram post images (skipping thumbnails, avatars, icons) and add high-res variants
+    image_urls = normalize_image_urls(candidates)
     
     print(f"✅ Found {len(image_urls)} unique image URLs")
     return image_urls
@@ -94,23 +83,8 @@ def download_images(image_urls: Set[str], output_dir: Path):
         try:
             print(f"   📥 [{i}/{len(image_urls)}] Downloading...", end='\r')
             
-            # Determine file extension
-            parsed = urlparse(url)
-            path = parsed.path
-            ext = Path(path).suffix
-            if not ext or ext not in ['.jpg', '.jpeg', '.png', '.webp']:
-                ext = '.jpg'
-            
-            # Download
-            response = session.get(url, timeout=30, stream=True)
-            response.raise_for_status()
-            
-            # Save
-            filename = output_dir / f"image_{i:04d}{ext}"
-            with open(filename, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            
+            # Download and save (written atomically, resumed if truncated)
+            download_file(session, url, output_dir / f"image_{i:04d}{image_extension(url)}")
             downloaded += 1
             
         except Exception as e:
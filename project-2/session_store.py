@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Shared session store for the Instagram downloaders.
+
+Persists login state between runs so each run doesn't have to log in again:
+- instaloader session files (one per login username)
+- browser cookie jars (saved from Selenium, reusable by the requests-based scripts)
+
+Everything lives under ~/.instagram_downloader/sessions/ by default
+(override with the INSTAGRAM_SESSION_DIR environment variable).
+"""
+
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Dict, Optional
+
+import requests
+
+DEFAULT_SESSION_DIR = Path.home() / ".instagram_downloader" / "sessions"
+
+# Instagram's login cookie; a jar without it is not a logged-in session
+LOGIN_COOKIE = "sessionid"
+
+
+class SessionStore:
+    """Persists and reloads instaloader sessions and browser cookie jars, with expiry checks."""
+    
+    def __init__(self, root=None, max_age_days=7):
+        """
+        Args:
+            root: Directory for session files (default: INSTAGRAM_SESSION_DIR or ~/.instagram_downloader/sessions)
+            max_age_days: Saved sessions older than this are treated as expired
+        """
+        self.root = Path(root or os.getenv('INSTAGRAM_SESSION_DIR') or DEFAULT_SESSION_DIR)
+        self.max_age = max_age_days * 24 * 3600
+    
+    def _ensure_root(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        try:
+            os.chmod(self.root, 0o700)  # Session files are credentials
+        except OSError:
+            pass
+    
+    def _is_fresh(self, path: Path) -> bool:
+        return path.exists() and time.time() - path.stat().st_mtime < self.max_age
+    
+    # --- instaloader sessions ---
+    
+    def instaloader_session_path(self, username: str) -> Path:
+        """Path of the saved instaloader session for a login username."""
+        return self.root / f"instaloader-{username}"
+    
+    def load_instaloader_session(self, loader, username: str) -> bool:
+        """
+        Load a saved instaloader session and check that it is still logged in.
+        
+        Returns:
+            True if the loader is now logged in as username
+        """
+        path = self.instaloader_session_path(username)
+        if not self._is_fresh(path):
+            return False
+        try:
+            loader.load_session_from_file(username, str(path))
+            return loader.test_login() == username
+        except Exception:
+            return False
+    
+    def save_instaloader_session(self, loader, username: str):
+        """Save the loader's current login session."""
+        self._ensure_root()
+        path = self.instaloader_session_path(username)
+        loader.save_session_to_file(str(path))
+        os.chmod(path, 0o600)
+    
+    # --- cookie jars ---
+    
+    def cookie_jar_path(self, name: str) -> Path:
+        """Path of a saved cookie jar."""
+        return self.root / f"cookies-{name}.json"
+    
+    def save_cookies(self, cookies: List[Dict], name: str = "browser") -> bool:
+        """
+        Save browser cookies (as returned by Selenium's driver.get_cookies()).
+        
+        Only logged-in jars are saved, so an anonymous run never overwrites a good session.
+        
+        Returns:
+            True if the jar was saved
+        """
+        if not any(cookie.get('name') == LOGIN_COOKIE for cookie in cookies):
+            return False
+        self._ensure_root()
+        path = self.cookie_jar_path(name)
+        # A unique temp file per call (created with mode 0600), so concurrent saves
+        # from several threads or processes never write into the same file
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.root, prefix=path.name + '.',
+                                         suffix='.tmp', delete=False) as f:
+            tmp_path = f.name
+            try:
+                json.dump({'saved_at': time.time(), 'cookies': cookies}, f)
+            except BaseException:
+                f.close()
+                os.unlink(tmp_path)
+                raise
+        os.replace(tmp_path, path)
+        return True
+    
+    def load_cookies(self, name: str = "browser") -> Optional[List[Dict]]:
+        """
+        Load a saved cookie jar, dropping expired cookies.
+        
+        Returns:
+            List of cookie dicts, or None if there is no usable logged-in jar
+        """
+        path = self.cookie_jar_path(name)
+        if not self._is_fresh(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                cookies = json.load(f).get('cookies', [])
+        except (OSError, json.JSONDecodeError):
+            return None
+        
+        now = time.time()
+        cookies = [cookie for cookie in cookies if not cookie.get('expiry') or cookie['expiry'] > now]
+        if not any(cookie.get('name') == LOGIN_COOKIE for cookie in cookies):
+            return None
+        return cookies
+    
+    def apply_cookies(self, session: requests.Session, name: str = "browser") -> bool:
+        """
+        Load a saved cookie jar into a requests session.
+        
+        Returns:
+            True if valid cookies were applied
+        """
+        cookies = self.load_cookies(name)
+        if not cookies:
+            return False
+        for cookie in cookies:
+            session.cookies.set(
+                cookie['name'],
+                cookie['value'],
+                domain=cookie.get('domain', ''),
+                path=cookie.get('path', '/'),
+            )
+        return True
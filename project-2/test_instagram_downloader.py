@@ -0,0 +1,92 @@
+"""Tests for the incremental sync in instagram_downloader.py (run with: python -m pytest project-2)."""
+
+from datetime import datetime, timedelta, timezone
+
+import instaloader
+
+from instagram_downloader import LATEST_STAMPS_FILE, sync_profile
+
+START = datetime(2026, 1, 1)
+
+
+class FakePost:
+    def __init__(self, day):
+        self.shortcode = f"post{day}"
+        self.date_utc = START + timedelta(days=day)
+
+
+class FakeProfile:
+    username = 'someone'
+    mediacount = 30
+    
+    def __init__(self, days):
+        self.days = days
+    
+    def get_posts(self):
+        return [FakePost(day) for day in self.days]
+
+
+def make_loader(failing=()):
+    """Real loader (for its error_catcher) whose download_post is faked."""
+    loader = instaloader.Instaloader(quiet=True)
+    downloaded = []
+    
+    def download_post(post, target):
+        if post.shortcode in failing:
+            raise instaloader.exceptions.ConnectionException("connection reset")
+        downloaded.append(post.shortcode)
+        return True
+    
+    loader.download_post = download_post
+    return loader, downloaded
+
+
+def stamp(output_path):
+    stamps = instaloader.LatestStamps(str(output_path / LATEST_STAMPS_FILE))
+    return stamps.get_last_post_timestamp(FakeProfile.username)
+
+
+def day(n):
+    return (START + timedelta(days=n)).replace(tzinfo=timezone.utc)
+
+
+def test_old_pinned_post_first_does_not_stop_sync(tmp_path):
+    loader, _ = make_loader()
+    sync_profile(loader, FakeProfile([5, 4, 3, 2, 1]), tmp_path)
+    assert stamp(tmp_path) == day(5)
+    
+    # An old pinned post heads the feed, followed by newer posts
+    loader, downloaded = make_loader()
+    result = sync_profile(loader, FakeProfile([1, 8, 7, 6, 5, 4]), tmp_path)
+    assert downloaded == ['post8', 'post7', 'post6']
+    assert result['checked'] == 5
+    assert stamp(tmp_path) == day(8)
+
+
+def test_stops_at_first_old_post_after_pinned_allowance(tmp_path):
+    loader, _ = make_loader()
+    sync_profile(loader, FakeProfile([5]), tmp_path)
+    
+    loader, downloaded = make_loader()
+    result = sync_profile(loader, FakeProfile([7, 6, 5, 4, 3, 2, 1]), tmp_path)
+    assert downloaded == ['post7', 'post6']
+    assert result['checked'] == 4
+
+
+def test_failed_post_is_retried_next_sync(tmp_path):
+    loader, _ = make_loader(failing={'post7'})
+    result = sync_profile(loader, FakeProfile(range(10, 0, -1)), tmp_path)
+    assert result['failed'] == 1
+    assert stamp(tmp_path) == day(6)
+    
+    loader, downloaded = make_loader()
+    sync_profile(loader, FakeProfile(range(12, 0, -1)), tmp_path)
+    assert downloaded == ['post12', 'post11', 'post10', 'post9', 'post8', 'post7']
+    assert stamp(tmp_path) == day(12)
+
+
+def test_failed_pinned_post_holds_back_stamp(tmp_path):
+    # A new pinned post fails, while newer posts below it succeed
+    loader, _ = make_loader(failing={'post5'})
+    sync_profile(loader, FakeProfile([5, 9, 8, 7, 6, 4, 3]), tmp_path)
+    assert stamp(tmp_path) == day(4)
@@ -0,0 +1,51 @@
+"""Tests for url_classifier.py (run with: python -m pytest project-2)."""
+
+from url_classifier import _legacy_normalize, classify, is_post_image, normalize_image_urls, synthetic_urls
+
+CDN = "https://scontent-lax3-1.cdninstagram.com/v/t51.2885-15"
+
+
+def test_classify_parses_size_and_media_id():
+    result = classify(f"{CDN}/s640x640/400000001_1001_7000000000000000001_n.jpg?stp=dst-jpg&oh=00_ab")
+    assert result.is_instagram
+    assert not result.is_skipped
+    assert result.is_post_image
+    assert result.size == 640
+    assert result.media_id == '400000001_1001_7000000000000000001'
+
+
+def test_classify_size_variants_share_media_id():
+    small = classify(f"{CDN}/s320x320/1_2_3_n.jpg")
+    large = classify(f"{CDN}/p1080x1080/1_2_3_n.jpg")
+    assert (small.size, large.size) == (320, 1080)
+    assert small.media_id == large.media_id == '1_2_3'
+
+
+def test_classify_without_size_or_media_id():
+    result = classify("https://www.instagram.com/static/images/photo.jpg")
+    assert result.is_post_image
+    assert result.size is None
+    assert result.media_id is None
+
+
+def test_classify_skipped_and_foreign_urls():
+    thumbnail = classify(f"{CDN}/s150x150/1_2_3_n.jpg")
+    assert thumbnail.is_instagram and thumbnail.is_skipped
+    assert thumbnail.size == 150
+    
+    foreign = classify("https://example.com/?next=https://instagram.com/1_2_3_n.jpg")
+    assert foreign == (foreign.url, False, False, None, None)
+
+
+def test_host_check_is_exact():
+    assert is_post_image("https://www.instagram.com:443/p/x/a.jpg")
+    assert is_post_image("https://instagram.com?x=1")
+    assert not is_post_image("https://evilinstagram.com/a.jpg")
+    assert not is_post_image("https://scontent.cdninstagram.com.evil.com/a.jpg")
+    assert not is_post_image("ftp://scontent.cdninstagram.com/a.jpg")
+
+
+def test_normalize_matches_legacy_on_synthetic_urls():
+    urls = synthetic_urls(5000, repeats=2)
+    assert normalize_image_urls(urls) == _legacy_normalize(urls)
+    assert all(classify(url).is_post_image == is_post_image(url) for url in urls)
@@ -0,0 +1,453 @@
+"""
+Headless batch mode for the image analyzer.
+
+Runs analyze_image() over a directory (recursively) or a manifest file (one
+image path per line) with a bounded pool of concurrent requests, and streams
+one JSON line per image to the output file; every result is also written to
+the results store (see results_store). Re-running with the same output
+file skips images that already have a result for the same prompt, so an
+interrupted run simply resumes.
+
+For many small images, --pack N sends N images per request (see
+analyze_images), and --benchmark compares that with one image per request.
+
+Usage:
+    python batch_analyze.py <directory|manifest.txt> -o results.jsonl [options]
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+from image_analyzer import (MODEL_NAME, analyze_image, analyze_images, get_cache, get_store, get_usage,
+                            usage_cost, usage_summary)
+from image_prep import DEFAULT_MAX_EDGE, DEFAULT_QUALITY, upload_summary
+from results_store import ResultsStore
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
+DEFAULT_PROMPT = "Describe the contents of the following image in detail"
+
+# Seconds before a single API request is abandoned; a timed-out request is retried
+DEFAULT_TIMEOUT = 60.0
+
+# analyze_image tags API failures as "API Error [<status>]: ..." (see api_error); only
+# those are retried. Local errors (missing or undecodable files) fail straight away.
+# Request timeouts show up as 504 (gRPC deadline) or 'network' (REST read timeout).
+API_ERROR_RE = re.compile(r'API Error \[(\w+)\]')
+QUOTA_STATUSES = {'429'}
+TRANSIENT_STATUSES = {'408', '500', '502', '503', '504', 'network'}
+
+
+class QuotaRateLimiter:
+    """
+    Spaces requests across all workers to stay under a requests-per-minute quota.
+    
+    When the API reports an exhausted quota, every worker pauses and the rate is
+    halved; it then recovers gradually as requests succeed again.
+    """
+    
+    def __init__(self, requests_per_minute=60, min_requests_per_minute=1):
+        self.max_rate = requests_per_minute / 60.0
+        self.min_rate = min(min_requests_per_minute, requests_per_minute) / 60.0
+        self.rate = self.max_rate
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+    
+    def wait(self):
+        """Block until the next request is allowed."""
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + 1.0 / self.rate
+        if delay > 0:
+            time.sleep(delay)
+    
+    def quota_exceeded(self, pause):
+        """Pause all workers for `pause` seconds and halve the request rate."""
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.next_slot = max(self.next_slot, time.monotonic() + pause)
+    
+    def succeeded(self):
+        """Recover towards the configured rate after a successful request."""
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+def iter_images(source):
+    """Yield image paths from a directory (recursively) or a manifest file."""
+    if os.path.isdir(source):
+        for dirpath, dirnames, filenames in os.walk(source):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS:
+                    yield os.path.abspath(os.path.join(dirpath, filename))
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source, 'r', encoding='utf-8') as f:
+            for line in f:
+                path = line.strip()
+                if path and not path.startswith('#'):
+                    yield os.path.abspath(os.path.join(base, path))
+
+
+def load_completed(output_path, prompt):
+    """Paths that already have a successful result for this prompt in the output file."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Last line of an interrupted run
+            if record.get('prompt') == prompt and record.get('text') is not None:
+                completed.add(record['path'])
+    return completed
+
+
+def retry_kind(error):
+    """
+    Classify an error message from analyze_image / analyze_images.
+    
+    Returns:
+        'quota' or 'transient' for API errors worth retrying, None otherwise
+    """
+    match = API_ERROR_RE.match(error)
+    if not match:
+        return None
+    if match.group(1) in QUOTA_STATUSES:
+        return 'quota'
+    if match.group(1) in TRANSIENT_STATUSES:
+        return 'transient'
+    return None
+
+
+def analyze_with_retry(image_path, prompt, limiter, retries=5, base_delay=2.0, use_cache=True,
+                       max_edge=DEFAULT_MAX_EDGE, quality=DEFAULT_QUALITY, timeout=DEFAULT_TIMEOUT):
+    """Analyze one image, retrying quota and transient API errors (including timeouts) with backoff."""
+    started = time.time()
+    for attempt in range(1, retries + 2):
+        # Cache hits return without consuming a rate limiter slot
+        text, error = analyze_image(image_path, prompt, use_cache, before_request=limiter.wait,
+                                     max_edge=max_edge, quality=quality, timeout=timeout)
+        if not error:
+            limiter.succeeded()
+            break
+        kind = retry_kind(error)
+        if attempt > retries or not kind:
+            break
+        delay = base_delay * 2 ** (attempt - 1) * (0.5 + random.random())
+        if kind == 'quota':
+            limiter.quota_exceeded(delay)
+        else:
+            time.sleep(delay)
+    
+    return {
+        'path': image_path,
+        'prompt': prompt,
+        'text': text,
+        'error': error,
+        'attempts': attempt,
+        'seconds': round(time.time() - started, 3),
+    }
+
+
+def analyze_pack_with_retry(image_paths, prompt, limiter, retries=5, base_delay=2.0, use_cache=True,
+                            max_edge=DEFAULT_MAX_EDGE, quality=DEFAULT_QUALITY, timeout=DEFAULT_TIMEOUT):
+    """Analyze images with one packed request, retrying the images hit by quota and transient errors."""
+    started = time.time()
+    records = [None] * len(image_paths)
+    pending = list(range(len(image_paths)))
+    for attempt in range(1, retries + 2):
+        results = analyze_images([image_paths[i] for i in pending], prompt, use_cache,
+                                 before_request=limiter.wait, max_edge=max_edge, quality=quality,
+                                 timeout=timeout)
+        retry = []
+        quota = False
+        for index, (text, error) in zip(pending, results):
+            records[index] = {
+                'path': image_paths[index],
+                'prompt': prompt,
+                'text': text,
+                'error': error,
+                'attempts': attempt,
+                'seconds': round(time.time() - started, 3),
+            }
+            kind = retry_kind(error) if error else None
+            if kind:
+                retry.append(index)
+                quota = quota or kind == 'quota'
+        if len(retry) < len(pending):
+            limiter.succeeded()
+        if not retry or attempt > retries:
+            break
+        pending = retry
+        delay = base_delay * 2 ** (attempt - 1) * (0.5 + random.random())
+        if quota:
+            limiter.quota_exceeded(delay)
+        else:
+            time.sleep(delay)
+    
+    return records
+
+
+def iter_packs(image_paths, pack_size):
+    """Group image paths into lists of up to pack_size."""
+    pack = []
+    for image_path in image_paths:
+        pack.append(image_path)
+        if len(pack) == pack_size:
+            yield pack
+            pack = []
+    if pack:
+        yield pack
+
+
+def run_batch(source, output_path, prompt=DEFAULT_PROMPT, workers=8, requests_per_minute=60, retries=5,
+              use_cache=True, max_edge=DEFAULT_MAX_EDGE, quality=DEFAULT_QUALITY, store=None, pack_size=1,
+              timeout=DEFAULT_TIMEOUT):
+    """
+    Analyze every image from source and append results to output_path (JSONL).
+    
+    Args:
+        source: Directory of images or manifest file with one path per line
+        output_path: JSONL file; images with a result for this prompt are skipped
+        prompt: Prompt sent with every image
+        workers: Maximum number of concurrent requests
+        requests_per_minute: Request quota shared by all workers
+        retries: Retries per image for quota and transient errors
+        use_cache: Answer repeated (image, prompt) pairs from the result cache
+        max_edge: Longest edge in pixels of uploaded images (0 uploads the original size)
+        quality: JPEG/WebP quality of re-encoded images
+        store: ResultsStore to write results to (default: the shared store)
+        pack_size: Images sent per request; above 1, images are packed with
+                   analyze_images() and fall back to single requests when needed
+        timeout: Seconds before each API request is abandoned and retried (None: no limit)
+    
+    Returns:
+        Dict with counts of analyzed, failed and skipped images
+    """
+    completed = load_completed(output_path, prompt)
+    store = store or get_store()
+    limiter = QuotaRateLimiter(requests_per_minute)
+    stats = {'analyzed': 0, 'failed': 0, 'skipped': 0}
+    started = time.time()
+    
+    def analyze(image_paths):
+        if pack_size > 1:
+            return analyze_pack_with_retry(image_paths, prompt, limiter, retries, use_cache=use_cache,
+                                           max_edge=max_edge, quality=quality, timeout=timeout)
+        return [analyze_with_retry(image_paths[0], prompt, limiter, retries, use_cache=use_cache,
+                                   max_edge=max_edge, quality=quality, timeout=timeout)]
+    
+    def record(future, out):
+        for result in future.result():
+            out.write(json.dumps(result, ensure_ascii=False) + '\n')
+            store.add(result['path'], prompt, MODEL_NAME, result['text'], result['error'], result['seconds'])
+            stats['analyzed' if result['text'] is not None else 'failed'] += 1
+            if result['error']:
+                print(f"\n  Failed: {result['path']}: {result['error']}")
+        out.flush()
+        done = stats['analyzed'] + stats['failed']
+        rate = done / max(time.time() - started, 1e-9)
+        print(f"  [{done}] {stats['analyzed']} ok, {stats['failed']} failed, {rate:.2f} images/s", end='\r')
+    
+    def remaining_images():
+        for image_path in iter_images(source):
+            if image_path in completed:
+                stats['skipped'] += 1
+            else:
+                yield image_path
+    
+    # Only a few requests beyond the pool size are queued at a time, so huge
+    # directories don't turn into one future per image up front
+    max_pending = workers * 2
+    with open(output_path, 'a', encoding='utf-8') as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for pack in iter_packs(remaining_images(), max(1, pack_size)):
+            if len(pending) >= max_pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record(future, out)
+            pending.add(pool.submit(analyze, pack))
+        for future in as_completed(pending):
+            record(future, out)
+    
+    elapsed = time.time() - started
+    print(f"\nDone in {elapsed:.1f}s: {stats['analyzed']} analyzed, {stats['failed']} failed, "
+          f"{stats['skipped']} already done")
+    if use_cache:
+        print(f"Result {get_cache().summary()}")
+    print(f"Image {upload_summary()}")
+    print(usage_summary())
+    print(f"Results stored in {store.path} ({store.count()} analyses)")
+    return stats
+
+
+def benchmark_packing(source, prompt=DEFAULT_PROMPT, pack_size=8, sample=40, workers=8, requests_per_minute=60,
+                      retries=5, max_edge=DEFAULT_MAX_EDGE, quality=DEFAULT_QUALITY, timeout=DEFAULT_TIMEOUT):
+    """
+    Compare one image per request with packed requests on a sample of images.
+    
+    Both runs bypass the result cache and store nothing, and use the same
+    workers and request quota, so only the packing differs.
+    
+    Args:
+        source: Directory of images or manifest file
+        prompt: Prompt sent with every image
+        pack_size: Images per packed request
+        sample: Number of images (the first ones from source) analyzed by each run
+        workers, requests_per_minute, retries, max_edge, quality, timeout: As for run_batch()
+    
+    Returns:
+        Dict mapping 'single' and 'packed' to dicts with images_per_second,
+        requests, cost_per_image, failed and fallbacks
+    """
+    image_paths = [path for path, _ in zip(iter_images(source), range(sample))]
+    print(f"Benchmarking {len(image_paths)} images: one per request vs {pack_size} per request "
+          f"({workers} workers, {requests_per_minute:g} requests/minute)")
+    report = {}
+    for mode, size in (('single', 1), ('packed', pack_size)):
+        limiter = QuotaRateLimiter(requests_per_minute)
+        before = get_usage()
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            if size > 1:
+                packs = pool.map(lambda pack: analyze_pack_with_retry(pack, prompt, limiter, retries, use_cache=False,
+                                                                      max_edge=max_edge, quality=quality,
+                                                                      timeout=timeout),
+                                 iter_packs(image_paths, size))
+            else:
+                packs = pool.map(lambda path: [analyze_with_retry(path, prompt, limiter, retries, use_cache=False,
+                                                                  max_edge=max_edge, quality=quality,
+                                                                  timeout=timeout)],
+                                 image_paths)
+            records = [record for pack in packs for record in pack]
+        elapsed = time.time() - started
+        usage = get_usage() - before
+        analyzed = sum(1 for record in records if record['text'] is not None)
+        report[mode] = {
+            'images_per_second': analyzed / max(elapsed, 1e-9),
+            'requests': usage['requests'],
+            'cost_per_image': usage_cost(usage) / max(analyzed, 1),
+            'failed': len(records) - analyzed,
+            'fallbacks': usage['fallbacks'],
+        }
+    
+    print(f"\n{'':<18}{'images/s':>10}{'requests':>10}{'$/image':>12}{'failed':>8}{'fallbacks':>11}")
+    for mode, label in (('single', "1 per request"), ('packed', f"{pack_size} per request")):
+        row = report[mode]
+        print(f"{label:<18}{row['images_per_second']:>10.2f}{row['requests']:>10}{row['cost_per_image']:>12.6f}"
+              f"{row['failed']:>8}{row['fallbacks']:>11}")
+    single, packed = report['single'], report['packed']
+    if single['images_per_second'] and single['cost_per_image']:
+        print(f"\nPacked: {packed['images_per_second'] / single['images_per_second']:.1f}x the throughput at "
+              f"{packed['cost_per_image'] / single['cost_per_image']:.0%} of the cost per image")
+    return report
+
+
+def main():
+    """Command-line entry point for batch analysis."""
+    if len(sys.argv) < 2:
+        print("Usage: python batch_analyze.py <directory|manifest.txt> [options]")
+        print("\nOptions:")
+        print("  -o, --output FILE   JSONL output file (default: results.jsonl)")
+        print("  -p, --prompt TEXT   Prompt sent with every image")
+        print("  -w, --workers N     Concurrent requests (default: 8)")
+        print("  --rpm N             Requests per minute quota (default: 60)")
+        print("  --retries N         Retries for quota/transient errors and timeouts (default: 5)")
+        print(f"  --timeout SECONDS   Abandon and retry requests that take longer (default: {DEFAULT_TIMEOUT:g}, 0 = no limit)")
+        print("  --no-cache          Always call the API, even for previously analyzed images")
+        print(f"  --max-edge N        Downscale uploads to N pixels on the longest edge (default: {DEFAULT_MAX_EDGE}, 0 = original)")
+        print(f"  --quality N         JPEG/WebP quality of downscaled uploads (default: {DEFAULT_QUALITY})")
+        print("  --pack N            Send N images per request (for many small images; default: 1)")
+        print("  --benchmark N       Compare --pack with one image per request on the first N images, then exit")
+        print("  --db FILE           Results store (default: ~/.image_analyzer/results.sqlite3)")
+        print("\nExample:")
+        print("  python batch_analyze.py ./photos -o captions.jsonl --workers 16 --rpm 300")
+        print("  python batch_analyze.py ./thumbnails --pack 8 --benchmark 40")
+        sys.exit(1)
+    
+    source = None
+    output = 'results.jsonl'
+    prompt = DEFAULT_PROMPT
+    workers = 8
+    rpm = 60.0
+    retries = 5
+    timeout = DEFAULT_TIMEOUT
+    use_cache = '--no-cache' not in sys.argv
+    max_edge = DEFAULT_MAX_EDGE
+    quality = DEFAULT_QUALITY
+    db_path = None
+    pack_size = 1
+    benchmark = 0
+    
+    i = 1
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        value = sys.argv[i + 1] if i + 1 < len(sys.argv) else None
+        if arg in ('-o', '--output') and value:
+            output = value
+            i += 2
+        elif arg in ('-p', '--prompt') and value:
+            prompt = value
+            i += 2
+        elif arg in ('-w', '--workers') and value:
+            workers = int(value)
+            i += 2
+        elif arg == '--rpm' and value:
+            rpm = float(value)
+            i += 2
+        elif arg == '--retries' and value:
+            retries = int(value)
+            i += 2
+        elif arg == '--timeout' and value:
+            timeout = float(value) or None
+            i += 2
+        elif arg == '--max-edge' and value:
+            max_edge = int(value)
+            i += 2
+        elif arg == '--quality' and value:
+            quality = int(value)
+            i += 2
+        elif arg == '--db' and value:
+            db_path = value
+            i += 2
+        elif arg == '--pack' and value:
+            pack_size = int(value)
+            i += 2
+        elif arg == '--benchmark' and value:
+            benchmark = int(value)
+            i += 2
+        elif not arg.startswith('-'):
+            source = arg
+            i += 1
+        else:
+            i += 1
+    
+    if not source or not os.path.exists(source):
+        print(f"Error: {source} does not exist")
+        sys.exit(1)
+    
+    if benchmark:
+        benchmark_packing(source, prompt, max(pack_size, 2), benchmark, workers, rpm, retries, max_edge, quality,
+                          timeout)
+        return
+    
+    packing = f", {pack_size} images per request" if pack_size > 1 else ""
+    print(f"Analyzing images from {source} -> {output} ({workers} workers, {rpm:g} requests/minute{packing})")
+    store = ResultsStore(db_path) if db_path else None
+    run_batch(source, output, prompt, workers, rpm, retries, use_cache, max_edge, quality, store, pack_size,
+              timeout)
+
+
+if __name__ == "__main__":
+    main()
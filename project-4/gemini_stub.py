@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Gemini generateContent REST endpoint.
+
+Point the analyzer at it with GEMINI_API_ENDPOINT to try batch mode, watch
+mode or the GUI without an API key, quota or network:
+
+    python gemini_stub.py --port 8765 --delay 0.2 --quota-every 10 &
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8765 python batch_analyze.py ./photos
+
+Every answer names the request number and the number of images, and reports
+token usage (258 tokens per image, like the real API's small-image rate).
+Packed requests (JSON response schema) get one result per image. Failures can
+be injected to check retries: --quota-every N answers every Nth request with
+429 RESOURCE_EXHAUSTED, and --stall-every N holds every Nth request for
+--stall seconds, to check request timeouts.
+
+Usage: python gemini_stub.py [options]
+"""
+
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKENS_PER_IMAGE = 258
+
+
+class StubState:
+    """Request counter and failure injection settings shared by all handler threads."""
+    
+    def __init__(self, delay=0.2, quota_every=0, stall_every=0, stall=60.0):
+        self.delay = delay
+        self.quota_every = quota_every
+        self.stall_every = stall_every
+        self.stall = stall
+        self.requests = 0
+        self.lock = threading.Lock()
+    
+    def next_request(self):
+        with self.lock:
+            self.requests += 1
+            return self.requests
+
+
+def make_handler(state):
+    """Request handler class answering generateContent and streamGenerateContent."""
+    
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            number = state.next_request()
+            time.sleep(state.stall if state.stall_every and number % state.stall_every == 0 else state.delay)
+            if state.quota_every and number % state.quota_every == 0:
+                self.send_json(429, {'error': {'code': 429, 'status': 'RESOURCE_EXHAUSTED',
+                                               'message': 'Resource has been exhausted (e.g. check quota).'}})
+                return
+            
+            parts = request.get('contents', [{}])[0].get('parts', [])
+            images = sum(1 for part in parts if 'inlineData' in part or 'inline_data' in part)
+            prompt_tokens = sum(len(part.get('text', '')) // 4 for part in parts) + TOKENS_PER_IMAGE * images
+            config = request.get('generationConfig', {})
+            if config.get('responseMimeType') == 'application/json':
+                # Packed request: one analysis per numbered image
+                results = [{'image': i, 'analysis': f"stub answer #{number}, image {i} of {images}"}
+                           for i in range(1, images + 1)]
+                text = json.dumps({'results': results})
+            else:
+                text = f"stub answer #{number} for {images} image(s)"
+            usage = {'promptTokenCount': prompt_tokens, 'candidatesTokenCount': 20 * max(images, 1),
+                     'totalTokenCount': prompt_tokens + 20 * max(images, 1)}
+            
+            if ':streamGenerateContent' in self.path:
+                words = text.split(' ')
+                chunks = [' '.join(words[i:i + 3]) + ' ' for i in range(0, len(words), 3)]
+                body = [{'candidates': [{'content': {'parts': [{'text': chunk}], 'role': 'model'}, 'index': 0}]}
+                        for chunk in chunks]
+                body[-1]['usageMetadata'] = usage
+            else:
+                body = {'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'},
+                                        'finishReason': 'STOP', 'index': 0}],
+                        'usageMetadata': usage}
+            self.send_json(200, body)
+        
+        def send_json(self, status, data):
+            body = json.dumps(data).encode()
+            try:
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # The client gave up (e.g. its request timed out)
+        
+        def log_message(self, *args):
+            pass
+    
+    return Handler
+
+
+def start_stub(port=0, **settings):
+    """
+    Start the stub in a background thread.
+    
+    Args:
+        port: Port to listen on (0 picks a free port)
+        settings: StubState settings (delay, quota_every, stall_every, stall)
+    
+    Returns:
+        (server, state); the endpoint is http://127.0.0.1:<server.server_address[1]>
+    """
+    state = StubState(**settings)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    """Main function."""
+    if '-h' in sys.argv or '--help' in sys.argv:
+        print("Usage: python gemini_stub.py [options]")
+        print("\nOptions:")
+        print("  --port N           Port to listen on (default: 8765)")
+        print("  --delay SECONDS    Latency of every request (default: 0.2)")
+        print("  --quota-every N    Answer every Nth request with 429 RESOURCE_EXHAUSTED")
+        print("  --stall-every N    Hold every Nth request for --stall seconds")
+        print("  --stall SECONDS    How long stalled requests are held (default: 60)")
+        sys.exit(0)
+    
+    port = 8765
+    settings = {}
+    options = {'--delay': ('delay', float), '--quota-every': ('quota_every', int),
+               '--stall-every': ('stall_every', int), '--stall': ('stall', float)}
+    i = 1
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        value = sys.argv[i + 1] if i + 1 < len(sys.argv) else None
+        if arg == '--port' and value:
+            port = int(value)
+            i += 2
+        elif arg in options and value:
+            name, convert = options[arg]
+            settings[name] = convert(value)
+            i += 2
+        else:
+            i += 1
+    
+    server, state = start_stub(port, **settings)
+    print(f"Gemini stub listening on http://127.0.0.1:{server.server_address[1]} "
+          f"(set GEMINI_API_ENDPOINT to this URL)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"\n{state.requests} requests served")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,504 @@
+import json
 import os
+import sqlite3
 import tkinter as tk
 from tkinter import ttk, filedialog, scrolledtext, messagebox
-from PIL import Image
-import google.generativeai as genai
-from dotenv import load_dotenv
 import threading
+import time
+import queue
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
-# Load environment variables from .env file
-load_dotenv()
+from image_prep import DEFAULT_MAX_EDGE, DEFAULT_QUALITY, prepare_image, record_upload, upload_summary
+from job_queue import CANCELLED, DONE, FAILED, FINISHED, QUEUED, RUNNING, TIMED_OUT, JobQueue
+from result_cache import ResultCache, file_hash
+from results_store import ResultsStore
 
-# Configure the Google API key
-api_key = os.getenv('GOOGLE_API_KEY')
-if api_key:
-    genai.configure(api_key=api_key)
-else:
-    print("Warning: GOOGLE_API_KEY not found in environment variables")
+# google.generativeai (the slowest import by far) and dotenv are only imported
+# on first use, so the window appears without waiting for them
 
+MODEL_NAME = 'gemini-2.5-flash-lite'
 
-def analyze_image(image_path, prompt):
-    """Analyze the image using the Gemini API."""
+# Price of MODEL_NAME in USD per million tokens, for the cost estimates in usage_summary()
+INPUT_PRICE_PER_M = 0.10
+OUTPUT_PRICE_PER_M = 0.40
+
+# How often the GUI refreshes the jobs list and appends streamed text (all chunks
+# received since the last refresh at once)
+STREAM_POLL_MS = 50
+
+# Concurrent requests when running several prompts against one image
+MAX_PROMPT_WORKERS = 8
+
+# Packed requests (analyze_images): the model answers for every image at once as
+# JSON matching this schema, one result per numbered image
+PACK_INSTRUCTIONS = (
+    "You are given {count} images, each preceded by a label \"Image <number>:\". "
+    "Apply the request below to each image separately, and return exactly one result "
+    "per image with the number from its label.\n\nRequest: {prompt}"
+)
+PACK_RESPONSE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'results': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'image': {'type': 'integer'},
+                    'analysis': {'type': 'string'},
+                },
+                'required': ['image', 'analysis'],
+            },
+        },
+    },
+    'required': ['results'],
+}
+
+# GUI job queue: analyses running at once, seconds before a job is stopped, jobs allowed to wait
+JOB_WORKERS = 2
+JOB_TIMEOUT = 120
+MAX_QUEUED_JOBS = 200
+
+IMAGE_FILETYPES = [
+    ("Image files", "*.jpg *.jpeg *.png *.gif *.bmp *.webp"),
+    ("All files", "*.*")
+]
+
+# Delay before the GUI starts warming up the model in the background
+WARMUP_DELAY_MS = 100
+
+_environment_loaded = False
+_models = {}
+_models_lock = threading.Lock()
+_cache = None
+_cache_lock = threading.Lock()
+_store = None
+_store_lock = threading.Lock()
+_usage = Counter()
+_usage_lock = threading.Lock()
+
+
+def load_environment():
+    """Load environment variables from the .env file (once)."""
+    global _environment_loaded
+    if not _environment_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _environment_loaded = True
+
+
+def _configure_api(genai):
+    """Configure the Google API key (and optional endpoint override) for the SDK."""
+    load_environment()
+    api_key = os.getenv('GOOGLE_API_KEY')
+    # Optional override of the API endpoint (e.g. http://127.0.0.1:8765 for a local stub or proxy)
+    api_endpoint = os.getenv('GEMINI_API_ENDPOINT')
+    if api_key and api_endpoint:
+        genai.configure(api_key=api_key, transport='rest', client_options={'api_endpoint': api_endpoint})
+    elif api_key:
+        genai.configure(api_key=api_key)
+    else:
+        print("Warning: GOOGLE_API_KEY not found in environment variables")
+
+
+def get_model(name=MODEL_NAME):
+    """
+    The shared GenerativeModel for a model name, created on first use.
+    
+    The first call imports and configures the Gemini SDK. Later calls return
+    the same model, which keeps its API client and open connections.
+    """
+    with _models_lock:
+        model = _models.get(name)
+        if model is None:
+            import google.generativeai as genai
+            if not _models:  # First model: configure the SDK
+                _configure_api(genai)
+            model = _models[name] = genai.GenerativeModel(name)
+        return model
+
+
+def warm_up(send_request=None):
+    """
+    Import the SDK and create the model in a background thread.
+    
+    Args:
+        send_request: Also send a tiny count_tokens request so the connection is
+                      open before the first analysis (default: GEMINI_WARMUP=1)
+    
+    Returns:
+        The started thread
+    """
+    def run():
+        try:
+            model = get_model()
+            if send_request or (send_request is None and os.getenv('GEMINI_WARMUP') == '1'):
+                model.count_tokens("warm-up")
+        except Exception as e:
+            print(f"Warning: model warm-up failed: {e}")
+    
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def get_cache():
+    """The shared result cache (opened on first use)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            load_environment()
+            _cache = ResultCache()
+        return _cache
+
+
+def get_store():
+    """The shared results store (opened on first use)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            load_environment()
+            _store = ResultsStore()
+        return _store
+
+
+def store_job_result(job, prompt, text, error):
+    """Persist one prompt's result of a job, unless the job was stopped rather than failed."""
+    if error and (job.cancel_requested.is_set() or job.remaining() <= 0):
+        return
+    try:
+        get_store().add(job.image_path, prompt, MODEL_NAME, text, error, time.perf_counter() - job.started)
+    except sqlite3.Error as e:
+        print(f"Could not store result for {job.image_path}: {e}")
+
+
+def record_usage(response, images):
+    """Count an API response's tokens, and the images it answered, towards usage_summary()."""
+    metadata = getattr(response, 'usage_metadata', None)
+    with _usage_lock:
+        _usage['requests'] += 1
+        _usage['images'] += images
+        if metadata:
+            _usage['input_tokens'] += metadata.prompt_token_count
+            _usage['output_tokens'] += metadata.candidates_token_count
+
+
+def get_usage():
+    """Copy of the API usage counters (requests, images, input_tokens, output_tokens, fallbacks)."""
+    with _usage_lock:
+        return Counter(_usage)
+
+
+def usage_cost(usage):
+    """Estimated cost in USD of the tokens in a usage Counter."""
+    return (usage['input_tokens'] * INPUT_PRICE_PER_M + usage['output_tokens'] * OUTPUT_PRICE_PER_M) / 1e6
+
+
+def usage_summary(usage=None):
+    """One-line summary of API usage and estimated cost per image (default: since startup)."""
+    usage = get_usage() if usage is None else usage
+    if not usage['requests']:
+        return "API usage: no requests"
+    images = max(usage['images'], 1)
+    summary = (f"API usage: {usage['requests']} requests for {usage['images']} images "
+               f"({usage['images'] / usage['requests']:.1f} per request), "
+               f"{usage['input_tokens'] / images:.0f} input + {usage['output_tokens'] / images:.0f} output "
+               f"tokens per image, ~${usage_cost(usage) / images:.6f} per image")
+    if usage['fallbacks']:
+        summary += f" ({usage['fallbacks']} images fell back to single requests)"
+    return summary
+
+
+def api_error(e):
+    """
+    Error message for a failed API request, tagged with what went wrong so callers
+    can tell retryable failures apart: "API Error [<tag>]: <message>", where the tag
+    is the HTTP status (google.api_core errors carry it as e.code), 'network' for
+    transport failures (timeouts, dropped connections) or the exception name.
+    """
+    code = getattr(e, 'code', None)
+    if isinstance(code, int):
+        tag = str(code)
+    elif isinstance(e, OSError):  # Includes requests' ConnectionError and Timeout
+        tag = 'network'
+    else:
+        tag = type(e).__name__
+    return f"API Error [{tag}]: {e}"
+
+
+def analyze_image(image_path, prompt, use_cache=True, before_request=None, max_edge=DEFAULT_MAX_EDGE,
+                  quality=DEFAULT_QUALITY, on_chunk=None, timeout=None):
+    """
+    Analyze the image using the Gemini API.
+    
+    Results are cached by (image content, prompt, model), so repeating an
+    analysis returns the stored answer without calling the API. Large images
+    are downscaled and re-encoded before upload (see image_prep).
+    
+    Args:
+        image_path: Path of the image to analyze
+        prompt: Prompt sent along with the image
+        use_cache: Look up and store the result in the shared result cache
+        before_request: Called right before an actual API request (not for cache
+                        hits), e.g. to wait for a rate limiter
+        max_edge: Longest edge in pixels of the uploaded image (0 uploads the original size)
+        quality: JPEG/WebP quality of re-encoded images
+        on_chunk: If given, the response is streamed and on_chunk(text) is called
+                  with each partial chunk as it arrives (once with the full text on
+                  a cache hit)
+        timeout: Seconds before the API request is abandoned (default: no limit)
+    
+    Returns:
+        (analysis text, None) on success, or (None, error message)
+    """
     try:
-        img = Image.open(image_path)
+        image_hash = file_hash(image_path) if use_cache else None
     except FileNotFoundError:
         return None, f"Error: File not found at {image_path}"
     except Exception as e:
         return None, f"Error opening image: {e}"
-
-    model = genai.GenerativeModel('gemini-2.5-flash-lite')
+    
+    if use_cache:
+        cached = get_cache().get(image_hash, prompt, MODEL_NAME)
+        if cached is not None:
+            if on_chunk:
+                on_chunk(cached)
+            return cached, None
     
     try:
-        response = model.generate_content([prompt, img])
-        return response.text, None
+        prepared = prepare_image(image_path, max_edge, quality)
+    except FileNotFoundError:
+        return None, f"Error: File not found at {image_path}"
+    except Exception as e:
+        return None, f"Error opening image: {e}"
+    
+    model = get_model()
+    if before_request:
+        before_request()
+    
+    record_upload(prepared)
+    try:
+        contents = [prompt, {'mime_type': prepared.mime_type, 'data': prepared.data}]
+        request_options = {'timeout': timeout} if timeout else None
+        if on_chunk:
+            response = model.generate_content(contents, stream=True, request_options=request_options)
+            for chunk in response:
+                try:
+                    piece = chunk.text
+                except ValueError:
+                    continue  # Chunk without text, e.g. only a finish reason
+                if piece:
+                    on_chunk(piece)
+        else:
+            response = model.generate_content(contents, request_options=request_options)
+        text = response.text
     except Exception as e:
-        return None, f"API Error: {e}"
+        return None, api_error(e)
+    record_usage(response, 1)
+    
+    if use_cache and text:
+        get_cache().put(image_hash, prompt, MODEL_NAME, text)
+    return text, None
+
+
+def analyze_prompts(image_path, prompts, use_cache=True, max_edge=DEFAULT_MAX_EDGE, quality=DEFAULT_QUALITY,
+                    max_workers=MAX_PROMPT_WORKERS, on_result=None, timeout=None):
+    """
+    Run several prompts against one image concurrently.
+    
+    The image is encoded once and every request reuses that payload, so the
+    total time is close to the slowest single request instead of the sum.
+    
+    Args:
+        image_path: Path of the image to analyze
+        prompts: List of prompts
+        use_cache: Look up and store results in the shared result cache
+        max_edge: Longest edge in pixels of the uploaded image (0 uploads the original size)
+        quality: JPEG/WebP quality of re-encoded images
+        max_workers: Maximum number of concurrent requests
+        on_result: Called as on_result(index, text, error) as each prompt finishes
+                   (from a worker thread)
+        timeout: Seconds before each API request is abandoned (default: no limit)
+    
+    Returns:
+        List of (analysis text, error message) tuples in the order of prompts
+    """
+    def run(index):
+        text, error = analyze_image(image_path, prompts[index], use_cache, max_edge=max_edge, quality=quality,
+                                    timeout=timeout)
+        if on_result:
+            on_result(index, text, error)
+        return text, error
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(prompts)))) as pool:
+        return list(pool.map(run, range(len(prompts))))
+
+
+def _parse_packed(text, count):
+    """Image number -> analysis from a packed JSON response (empty if it can't be parsed)."""
+    try:
+        items = json.loads(text)['results']
+    except (ValueError, KeyError, TypeError):
+        return {}
+    if not isinstance(items, list):
+        return {}
+    answers = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        number, analysis = item.get('image'), item.get('analysis')
+        if isinstance(number, int) and 1 <= number <= count and isinstance(analysis, str) and analysis.strip():
+            answers.setdefault(number, analysis.strip())
+    return answers
+
+
+def analyze_images(image_paths, prompt, use_cache=True, before_request=None, max_edge=DEFAULT_MAX_EDGE,
+                   quality=DEFAULT_QUALITY, timeout=None):
+    """
+    Analyze several images with the same prompt in a single request.
+    
+    The images are sent as numbered parts of one generate_content call, and
+    the model answers with JSON (PACK_RESPONSE_SCHEMA) holding one analysis
+    per image. For small images this saves most of the per-request overhead
+    and the repeated prompt tokens. Cached images are answered from the
+    cache, and images whose answer is missing or can't be parsed (or that
+    can't be opened) are analyzed one at a time with analyze_image().
+    
+    Args:
+        image_paths: Paths of the images to analyze
+        prompt: Prompt applied to every image
+        use_cache: Look up and store results in the shared result cache
+        before_request: Called right before each actual API request
+        max_edge: Longest edge in pixels of the uploaded images (0 uploads the original size)
+        quality: JPEG/WebP quality of re-encoded images
+        timeout: Seconds before each API request is abandoned (default: no limit)
+    
+    Returns:
+        List of (analysis text, error message) tuples in the order of image_paths;
+        if the packed request itself fails, every image in it gets its API error
+    """
+    results = [None] * len(image_paths)
+    packed = []  # (index, image hash, prepared image)
+    for index, image_path in enumerate(image_paths):
+        try:
+            image_hash = file_hash(image_path) if use_cache else None
+            cached = get_cache().get(image_hash, prompt, MODEL_NAME) if use_cache else None
+            if cached is not None:
+                results[index] = (cached, None)
+                continue
+            packed.append((index, image_hash, prepare_image(image_path, max_edge, quality)))
+        except Exception:
+            pass  # Reported by analyze_image() below
+    
+    if len(packed) > 1:
+        contents = [PACK_INSTRUCTIONS.format(count=len(packed), prompt=prompt)]
+        for number, (_, _, prepared) in enumerate(packed, 1):
+            record_upload(prepared)
+            contents += [f"Image {number}:", {'mime_type': prepared.mime_type, 'data': prepared.data}]
+        
+        model = get_model()
+        if before_request:
+            before_request()
+        try:
+            response = model.generate_content(
+                contents,
+                generation_config={'response_mime_type': 'application/json',
+                                   'response_schema': PACK_RESPONSE_SCHEMA},
+                request_options={'timeout': timeout} if timeout else None,
+            )
+        except Exception as e:
+            # Retrying (e.g. on quota errors) is up to the caller, so don't multiply the requests here
+            for index, _, _ in packed:
+                results[index] = (None, api_error(e))
+        else:
+            try:
+                answers = _parse_packed(response.text, len(packed))
+            except ValueError:
+                answers = {}  # No text, e.g. blocked by safety filters
+            record_usage(response, len(answers))
+            for number, (index, image_hash, _) in enumerate(packed, 1):
+                if number in answers:
+                    results[index] = (answers[number], None)
+                    if use_cache:
+                        get_cache().put(image_hash, prompt, MODEL_NAME, answers[number])
+            with _usage_lock:
+                _usage['fallbacks'] += len(packed) - len(answers)
+    
+    for index, image_path in enumerate(image_paths):
+        if results[index] is None:
+            results[index] = analyze_image(image_path, prompt, use_cache, before_request, max_edge, quality,
+                                           timeout=timeout)
+    return results
+
+
+def run_analysis_job(job):
+    """
+    Run a queued job (called on a JobQueue worker thread).
+    
+    Single-prompt jobs stream their text into the job and stop between chunks
+    when cancelled; multi-prompt jobs record each prompt's result as it finishes.
+    Every finished result is also written to the results store.
+    
+    Returns:
+        True if at least one prompt produced an analysis
+    """
+    if len(job.prompts) > 1:
+        def on_result(index, text, error):
+            job.set_result(index, text, error)
+            store_job_result(job, job.prompts[index], text, error)
+        
+        results = analyze_prompts(job.image_path, job.prompts, on_result=on_result, timeout=job.remaining())
+        job.check()
+        return any(error is None for _, error in results)
+    
+    def on_chunk(text):
+        job.check()
+        job.add_chunk(text)
+    
+    def note_request():
+        job.from_cache = False
+    
+    job.from_cache = True
+    text, error = analyze_image(job.image_path, job.prompts[0], on_chunk=on_chunk, before_request=note_request,
+                                timeout=job.remaining())
+    job.set_result(0, text, error)
+    if error:
+        job.check()  # Report cancellation or timeout rather than the error it caused
+        job.error = error
+    store_job_result(job, job.prompts[0], text, error)
+    return error is None
 
 
 class ImageAnalyzerApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Image Analyzer - Gemini AI")
-        self.root.geometry("900x700")
+        self.root.geometry("900x800")
         self.root.resizable(True, True)
         
         # Variables
         self.image_path = tk.StringVar()
         self.prompt_text = tk.StringVar(value="Describe the contents of the following image in detail")
+        self.multi_prompt = tk.BooleanVar(value=False)
+        
+        # Analyses run as jobs on a fixed pool of workers
+        self.jobs = JobQueue(run_analysis_job, JOB_WORKERS, JOB_TIMEOUT, MAX_QUEUED_JOBS)
+        self.drawn_versions = {}  # job id -> version shown in the jobs list
+        self.shown_job = None  # Job whose results are in the results area
+        self.shown_version = None
+        self.shown_length = 0  # Characters of the shown job's streamed text already inserted
+        self.shown_results = set()  # Prompt indexes of the shown job with a filled-in tab
+        self.last_counts = None
+        self.search_window = None
         
         self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
         
+        # Import and configure the SDK once the window is up, not before
+        self.root.after(WARMUP_DELAY_MS, warm_up)
+        self.root.after(STREAM_POLL_MS, self.refresh_jobs)
+    
     def setup_ui(self):
         # Main container
         main_frame = ttk.Frame(self.root, padding="10")
@@ -57,12 +508,20 @@ class ImageAnalyzerApp:
         self.root.columnconfigure(0, weight=1)
         self.root.rowconfigure(0, weight=1)
         main_frame.columnconfigure(1, weight=1)
-        main_frame.rowconfigure(3, weight=1)
         
         # Prompt label and entry
-        ttk.Label(main_frame, text="Prompt:").grid(row=0, column=0, sticky=tk.W, pady=5)
-        prompt_entry = ttk.Entry(main_frame, textvariable=self.prompt_text, width=60)
-        prompt_entry.grid(row=0, column=1, sticky=(tk.W, tk.E), pady=5, padx=5)
+        prompt_label_frame = ttk.Frame(main_frame)
+        prompt_label_frame.grid(row=0, column=0, sticky=(tk.W, tk.N), pady=5)
+        ttk.Label(prompt_label_frame, text="Prompt:").pack(anchor=tk.W)
+        ttk.Checkbutton(prompt_label_frame, text="Multiple\n(one per line)", variable=self.multi_prompt,
+                        command=self.toggle_multi_prompt).pack(anchor=tk.W, pady=(5, 0))
+        self.prompt_entry = ttk.Entry(main_frame, textvariable=self.prompt_text, width=60)
+        self.prompt_entry.grid(row=0, column=1, sticky=(tk.W, tk.E), pady=5, padx=5)
+        
+        # Multi-prompt mode: one prompt per line instead of the entry
+        self.prompts_text = tk.Text(main_frame, wrap=tk.WORD, width=60, height=6)
+        self.prompts_text.grid(row=0, column=1, sticky=(tk.W, tk.E), pady=5, padx=5)
+        self.prompts_text.grid_remove()
         
         # Image path label and entry
         ttk.Label(main_frame, text="Image Path:").grid(row=1, column=0, sticky=tk.W, pady=5)
@@ -76,37 +535,85 @@ class ImageAnalyzerApp:
         browse_btn = ttk.Button(path_frame, text="Browse", command=self.browse_image)
         browse_btn.grid(row=0, column=1)
         
-        # Analyze button
-        analyze_btn = ttk.Button(main_frame, text="Analyze Image", command=self.start_analysis)
-        analyze_btn.grid(row=2, column=0, columnspan=2, pady=10)
+        # Analyze buttons
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=2, column=0, columnspan=2, pady=10)
+        ttk.Button(button_frame, text="Analyze Image", command=self.start_analysis).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Queue Images...", command=self.queue_images).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Search Results...", command=self.open_search).pack(side=tk.LEFT, padx=5)
+        
+        # Job queue: progress, controls and one row per job
+        jobs_header = ttk.Frame(main_frame)
+        jobs_header.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E))
+        jobs_header.columnconfigure(2, weight=1)
+        ttk.Label(jobs_header, text="Jobs:").grid(row=0, column=0, sticky=tk.W)
+        self.jobs_progress = ttk.Progressbar(jobs_header, length=200, mode='determinate')
+        self.jobs_progress.grid(row=0, column=1, padx=5)
+        self.jobs_label = ttk.Label(jobs_header, text="No jobs")
+        self.jobs_label.grid(row=0, column=2, sticky=tk.W, padx=5)
+        ttk.Button(jobs_header, text="Cancel Selected", command=self.cancel_selected).grid(row=0, column=3, padx=(0, 5))
+        ttk.Button(jobs_header, text="Clear Finished", command=self.clear_finished).grid(row=0, column=4)
+        
+        jobs_frame = ttk.Frame(main_frame)
+        jobs_frame.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=5)
+        jobs_frame.columnconfigure(0, weight=1)
+        self.jobs_tree = ttk.Treeview(jobs_frame, columns=('image', 'prompt', 'status', 'time'), show='headings',
+                                      height=5)
+        for column, heading, width in (('image', "Image", 220), ('prompt', "Prompt", 320),
+                                       ('status', "Status", 90), ('time', "Time", 70)):
+            self.jobs_tree.heading(column, text=heading)
+            self.jobs_tree.column(column, width=width, stretch=column in ('image', 'prompt'))
+        self.jobs_tree.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        jobs_scrollbar = ttk.Scrollbar(jobs_frame, orient=tk.VERTICAL, command=self.jobs_tree.yview)
+        jobs_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.jobs_tree.configure(yscrollcommand=jobs_scrollbar.set)
+        self.jobs_tree.bind('<<TreeviewSelect>>', self.on_job_selected)
         
         # Results area
-        ttk.Label(main_frame, text="Analysis Results:").grid(row=3, column=0, columnspan=2, sticky=tk.W, pady=(10, 5))
+        ttk.Label(main_frame, text="Analysis Results:").grid(row=5, column=0, columnspan=2, sticky=tk.W, pady=(10, 5))
         self.results_text = scrolledtext.ScrolledText(main_frame, wrap=tk.WORD, width=80, height=20)
-        self.results_text.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=5)
-        main_frame.rowconfigure(4, weight=1)
+        self.results_text.grid(row=6, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=5)
+        main_frame.rowconfigure(6, weight=1)
+        
+        # Multi-prompt jobs: one tab per prompt instead of the single results area
+        self.results_tabs = ttk.Notebook(main_frame)
+        self.results_tabs.grid(row=6, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=5)
+        self.results_tabs.grid_remove()
+        self.prompt_results = []
         
         # Status bar
         self.status_label = ttk.Label(main_frame, text="Ready", relief=tk.SUNKEN, anchor=tk.W)
-        self.status_label.grid(row=5, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
-        
+        self.status_label.grid(row=7, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
+    
     def browse_image(self):
         """Open file dialog to select an image."""
-        filename = filedialog.askopenfilename(
-            title="Select an image",
-            filetypes=[
-                ("Image files", "*.jpg *.jpeg *.png *.gif *.bmp *.webp"),
-                ("All files", "*.*")
-            ]
-        )
+        filename = filedialog.askopenfilename(title="Select an image", filetypes=IMAGE_FILETYPES)
         if filename:
             self.image_path.set(filename)
             self.status_label.config(text=f"Selected: {os.path.basename(filename)}")
     
+    def toggle_multi_prompt(self):
+        """Switch between a single prompt and one prompt per line."""
+        if self.multi_prompt.get():
+            if not self.prompts_text.get(1.0, 'end-1c').strip():
+                self.prompts_text.insert(1.0, self.prompt_text.get().strip())
+            self.prompt_entry.grid_remove()
+            self.prompts_text.grid()
+        else:
+            self.prompts_text.grid_remove()
+            self.prompt_entry.grid()
+    
+    def get_prompts(self):
+        """The prompts to run: the entry, or each non-empty line in multi-prompt mode."""
+        if self.multi_prompt.get():
+            return [line.strip() for line in self.prompts_text.get(1.0, tk.END).splitlines() if line.strip()]
+        prompt = self.prompt_text.get().strip()
+        return [prompt] if prompt else []
+    
     def start_analysis(self):
-        """Start the image analysis in a separate thread."""
+        """Queue an analysis of the selected image and show its results as they arrive."""
         image_path = self.image_path.get().strip()
-        prompt = self.prompt_text.get().strip()
+        prompts = self.get_prompts()
         
         if not image_path:
             messagebox.showerror("Error", "Please select an image file.")
@@ -116,54 +623,303 @@ class ImageAnalyzerApp:
             messagebox.showerror("Error", f"The file '{image_path}' does not exist.")
             return
         
-        if not prompt:
+        if not prompts:
             messagebox.showerror("Error", "Please enter a prompt.")
             return
         
-        # Clear previous results
-        self.results_text.delete(1.0, tk.END)
-        self.status_label.config(text="Analyzing image... Please wait.")
-        
-        # Disable analyze button during analysis
-        self.analyze_btn = None
-        for widget in self.root.winfo_children():
-            for child in widget.winfo_children():
-                if isinstance(child, ttk.Button) and child.cget("text") == "Analyze Image":
-                    child.config(state="disabled")
-        
-        # Run analysis in a separate thread to prevent UI freezing
-        thread = threading.Thread(target=self.perform_analysis, args=(image_path, prompt))
-        thread.daemon = True
-        thread.start()
-    
-    def perform_analysis(self, image_path, prompt):
-        """Perform the actual analysis (runs in separate thread)."""
-        analysis, error = analyze_image(image_path, prompt)
-        
-        # Update UI in main thread
-        self.root.after(0, self.update_results, analysis, error)
-    
-    def update_results(self, analysis, error):
-        """Update the results text area (called from main thread)."""
-        # Re-enable analyze button
-        for widget in self.root.winfo_children():
-            for child in widget.winfo_children():
-                if isinstance(child, ttk.Button) and child.cget("text") == "Analyze Image":
-                    child.config(state="normal")
+        job = self.submit_job(image_path, prompts)
+        if job:
+            self.show_job(job)
+    
+    def queue_images(self):
+        """Queue an analysis of each of several images with the current prompt(s)."""
+        prompts = self.get_prompts()
+        if not prompts:
+            messagebox.showerror("Error", "Please enter a prompt.")
+            return
         
-        if error:
+        filenames = filedialog.askopenfilenames(title="Select images", filetypes=IMAGE_FILETYPES)
+        queued = 0
+        for filename in filenames:
+            if not self.submit_job(filename, prompts):
+                break
+            queued += 1
+        if queued:
+            self.status_label.config(text=f"Queued {queued} image{'s' if queued != 1 else ''}")
+    
+    def submit_job(self, image_path, prompts):
+        """Add a job to the queue and the jobs list; returns None if the queue is full."""
+        try:
+            job = self.jobs.submit(image_path, prompts)
+        except queue.Full:
+            messagebox.showerror("Error", f"The job queue is full ({MAX_QUEUED_JOBS} jobs waiting). "
+                                          "Wait for some jobs to finish or cancel them.")
+            return None
+        self.jobs_tree.insert('', tk.END, iid=str(job.id), values=self.job_row(job))
+        self.jobs_tree.see(str(job.id))
+        return job
+    
+    def job_row(self, job):
+        """Values of a job's row in the jobs list."""
+        if len(job.prompts) > 1:
+            prompt = f"{len(job.prompts)} prompts"
+        else:
+            prompt = job.prompts[0] if len(job.prompts[0]) <= 60 else job.prompts[0][:59] + "…"
+        elapsed = f"{job.finished - job.started:.1f}s" if job.finished and job.started else ""
+        return os.path.basename(job.image_path), prompt, job.status, elapsed
+    
+    def cancel_selected(self):
+        """Cancel the jobs selected in the jobs list."""
+        for iid in self.jobs_tree.selection():
+            job = self.jobs.get(int(iid))
+            if job:
+                self.jobs.cancel(job)
+    
+    def clear_finished(self):
+        """Remove finished jobs from the jobs list."""
+        for job in self.jobs.clear_finished():
+            self.jobs_tree.delete(str(job.id))
+            self.drawn_versions.pop(job.id, None)
+    
+    def on_job_selected(self, event=None):
+        """Show the results of the job clicked in the jobs list."""
+        selection = self.jobs_tree.selection()
+        if len(selection) == 1:
+            job = self.jobs.get(int(selection[0]))
+            if job and job is not self.shown_job:
+                self.show_job(job)
+    
+    def create_prompt_tabs(self, prompts):
+        """Replace the result tabs with one tab per prompt."""
+        for tab in self.results_tabs.tabs():
+            self.results_tabs.nametowidget(tab).destroy()
+        self.prompt_results = []
+        for i, prompt in enumerate(prompts, 1):
+            title = prompt if len(prompt) <= 24 else prompt[:23] + "…"
+            text = scrolledtext.ScrolledText(self.results_tabs, wrap=tk.WORD, width=80, height=20)
+            text.insert(tk.END, f"Prompt: {prompt}\n\nWaiting for result...")
+            self.results_tabs.add(text, text=f"{i}. {title}")
+            self.prompt_results.append(text)
+    
+    def show_job(self, job):
+        """Show a job's results (so far) in the results area."""
+        self.shown_job = job
+        self.shown_version = None
+        self.shown_length = 0
+        self.shown_results = set()
+        if len(job.prompts) > 1:
+            self.create_prompt_tabs(job.prompts)
+            self.results_text.grid_remove()
+            self.results_tabs.grid()
+        else:
             self.results_text.delete(1.0, tk.END)
-            self.results_text.insert(tk.END, f"Error: {error}")
-            self.status_label.config(text="Analysis failed")
-            messagebox.showerror("Error", error)
-        elif analysis:
+            self.results_tabs.grid_remove()
+            self.results_text.grid()
+        self.render_shown_job(announce_errors=False)
+    
+    def refresh_jobs(self):
+        """Redraw changed jobs and append new text of the shown job (runs every STREAM_POLL_MS)."""
+        for job in self.jobs.list_jobs():
+            if self.drawn_versions.get(job.id) != job.version:
+                self.drawn_versions[job.id] = job.version
+                if self.jobs_tree.exists(str(job.id)):
+                    self.jobs_tree.item(str(job.id), values=self.job_row(job))
+        
+        if self.shown_job is not None and self.shown_job.version != self.shown_version:
+            self.render_shown_job()
+        
+        counts = self.jobs.counts()
+        if counts != self.last_counts:
+            self.last_counts = counts
+            total = sum(counts.values())
+            finished = sum(counts[status] for status in FINISHED)
+            self.jobs_progress.config(maximum=max(total, 1), value=finished)
+            if total:
+                summary = f"{counts[RUNNING]} running, {counts[QUEUED]} queued, {finished} of {total} finished"
+                problems = [f"{counts[status]} {status}" for status in (FAILED, TIMED_OUT, CANCELLED) if counts[status]]
+                self.jobs_label.config(text=summary + (f" ({', '.join(problems)})" if problems else ""))
+            else:
+                self.jobs_label.config(text="No jobs")
+        
+        self.root.after(STREAM_POLL_MS, self.refresh_jobs)
+    
+    def render_shown_job(self, announce_errors=True):
+        """Bring the results area and status bar up to date with the shown job."""
+        job = self.shown_job
+        version, status, streamed, results = job.snapshot()
+        self.shown_version = version
+        
+        if len(job.prompts) > 1:
+            for index, result in enumerate(results):
+                if result is not None and index not in self.shown_results:
+                    self.shown_results.add(index)
+                    self.show_prompt_result(index, *result)
+        elif status == DONE:
+            # Normally the streamed text already is the full analysis
+            analysis = results[0][0] or "No analysis result returned."
+            if self.results_text.get(1.0, 'end-1c') != analysis:
+                self.results_text.delete(1.0, tk.END)
+                self.results_text.insert(tk.END, analysis)
+        elif status in FINISHED:
             self.results_text.delete(1.0, tk.END)
-            self.results_text.insert(tk.END, analysis)
-            self.status_label.config(text="Analysis complete")
+            self.results_text.insert(tk.END, f"Error: {job.error}")
+            if announce_errors and status == FAILED:
+                messagebox.showerror("Error", job.error)
+        elif len(streamed) > self.shown_length:
+            # Everything streamed since the last poll goes in with one insert
+            self.results_text.insert(tk.END, streamed[self.shown_length:])
+            self.results_text.see(tk.END)
+            self.shown_length = len(streamed)
+        
+        self.status_label.config(text=self.job_status_text(job, status))
+    
+    def job_status_text(self, job, status):
+        """Status bar text for the shown job."""
+        name = os.path.basename(job.image_path)
+        if status == QUEUED:
+            return f"{name}: queued, waiting for a free worker..."
+        if status == RUNNING:
+            if job.first_output is None:
+                return f"{name}: analyzing image... Please wait."
+            return f"{name}: receiving analysis... (first token after {job.first_output - job.started:.1f}s)"
+        if status == CANCELLED:
+            return f"{name}: analysis cancelled"
+        if status == TIMED_OUT:
+            return f"{name}: analysis timed out after {job.timeout:g}s"
+        if status == FAILED:
+            return f"{name}: analysis failed"
+        
+        total_time = job.finished - job.started
+        first_output = (job.first_output or job.finished) - job.started
+        stats = f"{get_cache().summary()}; {upload_summary()}"
+        if len(job.prompts) > 1:
+            failed = sum(1 for result in job.results if result and result[1])
+            count = len(job.prompts)
+            outcome = f"{count - failed} of {count} prompts complete" if failed else f"{count} prompts complete"
+            return f"{name}: {outcome} (first result {first_output:.1f}s, total {total_time:.1f}s; {stats})"
+        source = "from cache" if job.from_cache else "from Gemini"
+        return (f"{name}: analysis complete ({source}; first token {first_output:.1f}s, "
+                f"total {total_time:.1f}s; {stats})")
+    
+    def show_prompt_result(self, index, text, error):
+        """Fill in the tab of a finished prompt (called from main thread)."""
+        result_text = self.prompt_results[index]
+        title = self.results_tabs.tab(index, 'text')
+        result_text.delete(1.0, tk.END)
+        if error:
+            result_text.insert(tk.END, f"Error: {error}")
+            self.results_tabs.tab(index, text=f"{title} (failed)")
         else:
-            self.results_text.delete(1.0, tk.END)
-            self.results_text.insert(tk.END, "No analysis result returned.")
-            self.status_label.config(text="Analysis returned no results")
+            result_text.insert(tk.END, text or "No analysis result returned.")
+    
+    def open_search(self):
+        """Open the window for searching stored results (or raise it if it is open)."""
+        if self.search_window is not None and self.search_window.window.winfo_exists():
+            self.search_window.window.lift()
+            self.search_window.query_entry.focus_set()
+            return
+        try:
+            store = get_store()
+        except sqlite3.Error as e:
+            messagebox.showerror("Error", f"Could not open the results store: {e}")
+            return
+        self.search_window = SearchWindow(self.root, store)
+    
+    def close(self):
+        """Cancel outstanding jobs and close the window."""
+        self.jobs.shutdown()
+        self.root.destroy()
+
+
+class SearchWindow:
+    """Full-text search over every stored analysis (see results_store)."""
+    
+    def __init__(self, root, store):
+        self.store = store
+        self.results = {}  # Tree item -> stored result
+        
+        self.window = tk.Toplevel(root)
+        self.window.title("Search Results")
+        self.window.geometry("850x600")
+        self.window.columnconfigure(0, weight=1)
+        self.window.rowconfigure(2, weight=1)
+        
+        # Query entry
+        query_frame = ttk.Frame(self.window, padding="10 10 10 0")
+        query_frame.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        query_frame.columnconfigure(1, weight=1)
+        ttk.Label(query_frame, text="Search:").grid(row=0, column=0, sticky=tk.W)
+        self.query = tk.StringVar()
+        self.query_entry = ttk.Entry(query_frame, textvariable=self.query)
+        self.query_entry.grid(row=0, column=1, sticky=(tk.W, tk.E), padx=5)
+        self.query_entry.bind('<Return>', self.search)
+        ttk.Button(query_frame, text="Search", command=self.search).grid(row=0, column=2)
+        
+        # Matches
+        tree_frame = ttk.Frame(self.window, padding="10 5")
+        tree_frame.grid(row=1, column=0, sticky=(tk.W, tk.E))
+        tree_frame.columnconfigure(0, weight=1)
+        self.tree = ttk.Treeview(tree_frame, columns=('image', 'prompt', 'match', 'date'), show='headings',
+                                 height=10)
+        for column, heading, width in (('image', "Image", 160), ('prompt', "Prompt", 180),
+                                       ('match', "Match", 380), ('date', "Date", 110)):
+            self.tree.heading(column, text=heading)
+            self.tree.column(column, width=width, stretch=column in ('prompt', 'match'))
+        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        tree_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        tree_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.tree.configure(yscrollcommand=tree_scrollbar.set)
+        self.tree.bind('<<TreeviewSelect>>', self.on_select)
+        
+        # Full text of the selected result
+        self.detail_text = scrolledtext.ScrolledText(self.window, wrap=tk.WORD, height=12)
+        self.detail_text.grid(row=2, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=10)
+        
+        self.status_label = ttk.Label(self.window, relief=tk.SUNKEN, anchor=tk.W,
+                                      text=f"{self.store.count()} stored analyses")
+        self.status_label.grid(row=3, column=0, sticky=(tk.W, tk.E), padx=10, pady=(5, 10))
+        
+        self.show(self.store.recent(), "Most recent analyses")
+        self.query_entry.focus_set()
+    
+    def search(self, event=None):
+        query = self.query.get().strip()
+        if not query:
+            self.show(self.store.recent(), "Most recent analyses")
+            return
+        started = time.perf_counter()
+        try:
+            results = self.store.search(query)
+        except sqlite3.Error as e:
+            self.status_label.config(text=f"Search failed: {e}")
+            return
+        elapsed = (time.perf_counter() - started) * 1000
+        self.show(results, f"{len(results)} match{'es' if len(results) != 1 else ''} for {query!r} "
+                           f"in {elapsed:.1f} ms")
+    
+    def show(self, results, status):
+        self.tree.delete(*self.tree.get_children())
+        self.results = {}
+        for result in results:
+            snippet = ' '.join((result['snippet'] or result['error'] or '').split())
+            date = time.strftime('%Y-%m-%d %H:%M', time.localtime(result['created']))
+            item = self.tree.insert('', tk.END, values=(os.path.basename(result['path']), result['prompt'],
+                                                        snippet, date))
+            self.results[item] = result
+        self.detail_text.delete(1.0, tk.END)
+        self.status_label.config(text=status)
+    
+    def on_select(self, event=None):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        result = self.results[selection[0]]
+        seconds = f"{result['seconds']:.1f}s" if result['seconds'] is not None else "unknown time"
+        self.detail_text.delete(1.0, tk.END)
+        self.detail_text.insert(tk.END, f"Image: {result['path']}\n"
+                                        f"Prompt: {result['prompt']}\n"
+                                        f"Model: {result['model']} ({seconds})\n\n")
+        self.detail_text.insert(tk.END, result['text'] if result['text'] is not None else result['error'])
 
 
 def main():
@@ -0,0 +1,154 @@
+"""
+Image preprocessing before upload to Gemini.
+
+Camera photos are often 20-50 megapixels, far more than the model needs, and
+uploading them at full size dominates request latency. prepare_image() shrinks
+an image so its longest edge is at most max_edge pixels and re-encodes it:
+- JPEGs are decoded at reduced scale with Image.draft(), so a 6000x4000 photo
+  is never fully decompressed
+- other formats are shrunk with a fast integer Image.reduce() before the final
+  high-quality resize
+- images that are already small enough in a format Gemini accepts are sent
+  unchanged
+
+Encoded payloads are memoized (per file, size, mtime and settings), so
+analyzing the same image with several prompts encodes it only once. Pillow is
+imported on first use, so importing this module stays cheap.
+"""
+
+import io
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+DEFAULT_MAX_EDGE = 1536
+DEFAULT_QUALITY = 85
+
+# Formats Gemini accepts as-is
+UPLOAD_MIME_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp'}
+
+MAX_MEMO_ENTRIES = 64
+
+PreparedImage = namedtuple('PreparedImage', ['data', 'mime_type', 'size', 'original_bytes'])
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+_encoding = {}
+_stats = {'uploads': 0, 'original_bytes': 0, 'sent_bytes': 0}
+_stats_lock = threading.Lock()
+
+
+def _has_alpha(img):
+    return img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info)
+
+
+def _shrink(img, max_edge):
+    """Downscale img so its longest edge is at most max_edge, using the cheap paths first."""
+    from PIL import Image
+    
+    scale = max_edge / max(img.size)
+    target = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    
+    if img.format == 'JPEG':
+        # Let the decoder skip detail we are going to throw away (1/2, 1/4 or 1/8 scale)
+        img.draft('RGB' if img.mode == 'RGB' else None, target)
+    
+    # Integer box reduction first, leaving at least a 2x margin for the final resample
+    factor = int(min(img.width / target[0], img.height / target[1]) // 2)
+    if factor > 1:
+        img = img.reduce(factor)
+    return img.resize(target, Image.LANCZOS)
+
+
+def _encode(img, quality):
+    """Encode as JPEG, or WebP when the image has transparency."""
+    buffer = io.BytesIO()
+    if _has_alpha(img):
+        img.convert('RGBA').save(buffer, format='WEBP', quality=quality)
+        return buffer.getvalue(), 'image/webp'
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    img.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue(), 'image/jpeg'
+
+
+def _prepare(image_path, max_edge, quality, original_bytes):
+    from PIL import Image, ImageOps
+    
+    with Image.open(image_path) as img:
+        needs_resize = max_edge and max(img.size) > max_edge
+        if not needs_resize and img.format in UPLOAD_MIME_TYPES:
+            with open(image_path, 'rb') as f:
+                data = f.read()
+            return PreparedImage(data, UPLOAD_MIME_TYPES[img.format], img.size, original_bytes)
+        
+        if needs_resize:
+            img = _shrink(img, max_edge)
+        # Re-encoding drops EXIF, so apply its orientation to the pixels first
+        img = ImageOps.exif_transpose(img)
+        data, mime_type = _encode(img, quality)
+        return PreparedImage(data, mime_type, img.size, original_bytes)
+
+
+def prepare_image(image_path, max_edge=DEFAULT_MAX_EDGE, quality=DEFAULT_QUALITY):
+    """
+    Downscale and re-encode an image for upload.
+    
+    Args:
+        image_path: Path of the image
+        max_edge: Maximum width/height in pixels (0 or None keeps the original size)
+        quality: JPEG/WebP quality used when the image is re-encoded
+    
+    Returns:
+        PreparedImage with the encoded bytes, MIME type, pixel size and original file size
+    """
+    stat = os.stat(image_path)
+    memo_key = (os.path.abspath(image_path), stat.st_size, stat.st_mtime_ns, max_edge, quality)
+    with _memo_lock:
+        prepared = _memo.get(memo_key)
+        if prepared is not None:
+            _memo.move_to_end(memo_key)
+            return prepared
+        # Concurrent requests for the same image (e.g. several prompts) wait for one encode
+        key_lock = _encoding.setdefault(memo_key, threading.Lock())
+    
+    with key_lock:
+        with _memo_lock:
+            prepared = _memo.get(memo_key)
+        if prepared is not None:
+            return prepared
+        try:
+            prepared = _prepare(image_path, max_edge, quality, stat.st_size)
+            with _memo_lock:
+                _memo[memo_key] = prepared
+                while len(_memo) > MAX_MEMO_ENTRIES:
+                    _memo.popitem(last=False)
+        finally:
+            with _memo_lock:
+                _encoding.pop(memo_key, None)
+    return prepared
+
+
+def record_upload(prepared):
+    """Count an uploaded image towards the bytes-saved statistics."""
+    with _stats_lock:
+        _stats['uploads'] += 1
+        _stats['original_bytes'] += prepared.original_bytes
+        _stats['sent_bytes'] += len(prepared.data)
+
+
+def _format_bytes(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def upload_summary():
+    """One-line description of the upload sizes saved by preprocessing in this process."""
+    with _stats_lock:
+        uploads, original, sent = _stats['uploads'], _stats['original_bytes'], _stats['sent_bytes']
+    saved = 1 - sent / original if original else 0.0
+    return (f"uploads: {uploads} images, {_format_bytes(original)} -> {_format_bytes(sent)} "
+            f"({saved:.0%} saved)")
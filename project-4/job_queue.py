@@ -0,0 +1,196 @@
+"""
+Job queue behind the image analyzer GUI.
+
+Jobs run on a fixed pool of worker threads no matter how many are queued, and
+the number of jobs waiting for a worker is capped. Every job has a deadline
+and can be cancelled: a queued job never starts, and a running job stops at
+its next check() (e.g. between streamed chunks), while its API request is
+bounded by the remaining time.
+
+Workers only update AnalysisJob objects; the GUI polls them and redraws the
+jobs whose version changed since it last looked.
+"""
+
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+TIMED_OUT = 'timed out'
+FINISHED = {DONE, FAILED, CANCELLED, TIMED_OUT}
+
+
+class JobStopped(Exception):
+    """Raised by AnalysisJob.check() when a running job was cancelled or ran out of time."""
+
+
+class AnalysisJob:
+    """One analysis of an image with one or more prompts."""
+    
+    def __init__(self, job_id, image_path, prompts, timeout):
+        self.id = job_id
+        self.image_path = image_path
+        self.prompts = prompts
+        self.timeout = timeout
+        self.status = QUEUED
+        self.chunks = []  # Streamed text so far (single-prompt jobs)
+        self.results = [None] * len(prompts)  # (text, error) per prompt once finished
+        self.error = None
+        self.from_cache = False
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.first_output = None
+        self.finished = None
+        self.version = 0  # Bumped on every change
+        self.lock = threading.Lock()
+        self.cancel_requested = threading.Event()
+        self.future = None
+    
+    def remaining(self):
+        """Seconds left before the job's deadline (the full timeout while it is queued)."""
+        if self.started is None:
+            return self.timeout
+        return self.started + self.timeout - time.perf_counter()
+    
+    def check(self):
+        """Raise JobStopped if the job was cancelled or is past its deadline."""
+        if self.cancel_requested.is_set():
+            raise JobStopped("Cancelled")
+        if self.remaining() <= 0:
+            raise JobStopped(f"Timed out after {self.timeout:g}s")
+    
+    def add_chunk(self, text):
+        """Record streamed text of a single-prompt job."""
+        with self.lock:
+            if self.first_output is None:
+                self.first_output = time.perf_counter()
+            self.chunks.append(text)
+            self.version += 1
+    
+    def set_result(self, index, text, error):
+        """Record the finished result of one prompt."""
+        with self.lock:
+            if self.first_output is None:
+                self.first_output = time.perf_counter()
+            self.results[index] = (text, error)
+            self.version += 1
+    
+    def set_status(self, status, error=None):
+        with self.lock:
+            self.status = status
+            if error:
+                self.error = error
+            if status == RUNNING:
+                self.started = time.perf_counter()
+            elif status in FINISHED:
+                self.finished = time.perf_counter()
+            self.version += 1
+    
+    def snapshot(self):
+        """(version, status, streamed text, results) read consistently."""
+        with self.lock:
+            return self.version, self.status, ''.join(self.chunks), list(self.results)
+
+
+class JobQueue:
+    """Runs AnalysisJobs on a fixed number of worker threads."""
+    
+    def __init__(self, run, workers=2, timeout=120, max_queued=200):
+        """
+        Args:
+            run: Called as run(job) on a worker thread; records output on the job,
+                 calls job.check() where it can stop early, and returns True on success
+            workers: Number of jobs running at the same time
+            timeout: Seconds a job may run before it is stopped
+            max_queued: Maximum number of jobs waiting for a worker
+        """
+        self.run = run
+        self.timeout = timeout
+        self.max_queued = max_queued
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analysis')
+        self.jobs = []
+        self.lock = threading.Lock()
+        self.next_id = 1
+    
+    def submit(self, image_path, prompts):
+        """
+        Queue an analysis job.
+        
+        Returns:
+            The new AnalysisJob
+        
+        Raises:
+            queue.Full: If max_queued jobs are already waiting
+        """
+        with self.lock:
+            waiting = sum(1 for job in self.jobs if job.status == QUEUED)
+            if waiting >= self.max_queued:
+                raise queue.Full(f"{waiting} jobs are already waiting")
+            job = AnalysisJob(self.next_id, image_path, list(prompts), self.timeout)
+            self.next_id += 1
+            self.jobs.append(job)
+        job.future = self.pool.submit(self._run, job)
+        return job
+    
+    def _run(self, job):
+        if job.cancel_requested.is_set():
+            job.set_status(CANCELLED, "Cancelled")
+            return
+        job.set_status(RUNNING)
+        try:
+            succeeded = self.run(job)
+            error = None
+        except JobStopped as e:
+            succeeded, error = False, str(e)
+        except Exception as e:
+            succeeded, error = False, f"Unexpected error: {e}"
+        
+        if succeeded:
+            job.set_status(DONE)
+        elif job.cancel_requested.is_set():
+            job.set_status(CANCELLED, "Cancelled")
+        elif job.remaining() <= 0:
+            job.set_status(TIMED_OUT, f"Timed out after {job.timeout:g}s")
+        else:
+            job.set_status(FAILED, error)
+    
+    def cancel(self, job):
+        """Cancel a job: a queued job is dropped, a running one stops as soon as it can."""
+        if job.status in FINISHED:
+            return
+        job.cancel_requested.set()
+        if job.future is not None and job.future.cancel():
+            job.set_status(CANCELLED, "Cancelled")
+    
+    def get(self, job_id):
+        with self.lock:
+            return next((job for job in self.jobs if job.id == job_id), None)
+    
+    def list_jobs(self):
+        """All jobs in submission order."""
+        with self.lock:
+            return list(self.jobs)
+    
+    def counts(self):
+        """Number of jobs per status."""
+        with self.lock:
+            return Counter(job.status for job in self.jobs)
+    
+    def clear_finished(self):
+        """Forget finished jobs and return them."""
+        with self.lock:
+            finished = [job for job in self.jobs if job.status in FINISHED]
+            self.jobs = [job for job in self.jobs if job.status not in FINISHED]
+        return finished
+    
+    def shutdown(self):
+        """Cancel every job and stop the workers without waiting for running requests."""
+        for job in self.list_jobs():
+            self.cancel(job)
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,166 @@
+"""
+Persistent cache of Gemini analysis results.
+
+Results are keyed by (image content hash, prompt, model name), so the same
+image analyzed with the same prompt is answered from disk instead of making a
+new, billed API call - even if the file was renamed or copied. The store is a
+single SQLite file with least-recently-used eviction once it holds more than
+max_entries results.
+
+The cache lives in ~/.image_analyzer/cache.sqlite3 by default (override with
+the IMAGE_ANALYZER_CACHE environment variable).
+
+Usage:
+    python result_cache.py            # show cache statistics
+    python result_cache.py --clear    # delete all cached results
+"""
+
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".image_analyzer", "cache.sqlite3")
+
+# Same bound as the result cache's default size; least recently used hashes are dropped
+MAX_HASH_MEMO_ENTRIES = 20000
+
+_hash_memo = OrderedDict()
+_hash_lock = threading.Lock()
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents (memoized while the file's size and mtime are unchanged)."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _hash_lock:
+        cached = _hash_memo.get(memo_key)
+        if cached:
+            _hash_memo.move_to_end(memo_key)
+            return cached
+    
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    value = digest.hexdigest()
+    with _hash_lock:
+        _hash_memo[memo_key] = value
+        while len(_hash_memo) > MAX_HASH_MEMO_ENTRIES:
+            _hash_memo.popitem(last=False)
+    return value
+
+
+class ResultCache:
+    """SQLite-backed LRU cache of analysis results, safe to share between threads."""
+    
+    def __init__(self, path=None, max_entries=20000):
+        """
+        Args:
+            path: SQLite file (default: IMAGE_ANALYZER_CACHE or ~/.image_analyzer/cache.sqlite3)
+            max_entries: Least recently used results beyond this count are evicted
+        """
+        self.path = path or os.getenv('IMAGE_ANALYZER_CACHE') or DEFAULT_CACHE_PATH
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                image_hash TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                model TEXT NOT NULL,
+                text TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self.conn.commit()
+    
+    @staticmethod
+    def make_key(image_hash, prompt, model):
+        """Cache key for an (image, prompt, model) combination."""
+        return hashlib.sha256(f"{model}\0{prompt}\0{image_hash}".encode('utf-8')).hexdigest()
+    
+    def get(self, image_hash, prompt, model):
+        """Return the cached result text, or None (counts a hit or a miss)."""
+        key = self.make_key(image_hash, prompt, model)
+        with self.lock:
+            row = self.conn.execute("SELECT text FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            return row[0]
+    
+    def put(self, image_hash, prompt, model, text):
+        """Store a result, evicting the least recently used ones if the cache is full."""
+        key = self.make_key(image_hash, prompt, model)
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO results (key, image_hash, prompt, model, text, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, image_hash, prompt, model, text, now, now),
+            )
+            count = self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            if count > self.max_entries:
+                self.conn.execute(
+                    "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self.conn.commit()
+    
+    def clear(self):
+        """Delete all cached results."""
+        with self.lock:
+            self.conn.execute("DELETE FROM results")
+            self.conn.commit()
+            self.conn.execute("VACUUM")
+    
+    def entry_count(self):
+        """Number of cached results."""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+    
+    def hit_rate(self):
+        """Fraction of lookups answered from the cache in this process."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+    
+    def summary(self):
+        """One-line description of this process's cache usage."""
+        return f"cache: {self.hits} hits / {self.hits + self.misses} lookups ({self.hit_rate():.0%})"
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def main():
+    """Show cache statistics, or clear the cache with --clear."""
+    cache = ResultCache()
+    if '--clear' in sys.argv:
+        cache.clear()
+        print(f"Cleared {cache.path}")
+        return
+    size = os.path.getsize(cache.path) if os.path.exists(cache.path) else 0
+    print(f"Cache: {cache.path}")
+    print(f"  {cache.entry_count()} results (max {cache.max_entries}), {size / 1024:.0f} KB on disk")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Local, searchable store of analysis results.
+
+Every analysis run from the GUI, batch mode or watch mode is stored with the
+image path, its content hash, the prompt, the model, how long it took and the
+output (or error), in a single SQLite file. An FTS5 full-text index over the
+output, prompt and path makes earlier answers searchable in milliseconds
+instead of asking the model again. Re-analyzing the same file contents with
+the same prompt and model replaces the earlier result.
+
+The store lives in ~/.image_analyzer/results.sqlite3 by default (override with
+the IMAGE_ANALYZER_RESULTS environment variable).
+
+Usage:
+    python results_store.py                      # show store statistics
+    python results_store.py <query> [options]    # full-text search
+
+Queries use SQLite FTS5 syntax: words (all must match), "exact phrases",
+prefix*, OR, NOT, and column filters such as prompt:objects.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+from result_cache import file_hash
+
+DEFAULT_RESULTS_PATH = os.path.join(os.path.expanduser("~"), ".image_analyzer", "results.sqlite3")
+
+
+def _quote_terms(query):
+    """Turn free text into an FTS5 query of quoted terms (for input that isn't valid FTS5 syntax)."""
+    terms = ['"' + term.replace('"', '""') + '"' for term in query.split()]
+    return ' '.join(terms)
+
+
+class ResultsStore:
+    """SQLite store of analysis results with a full-text index, safe to share between threads."""
+    
+    def __init__(self, path=None):
+        """
+        Args:
+            path: SQLite file (default: IMAGE_ANALYZER_RESULTS or ~/.image_analyzer/results.sqlite3)
+        """
+        self.path = path or os.getenv('IMAGE_ANALYZER_RESULTS') or DEFAULT_RESULTS_PATH
+        self.lock = threading.Lock()
+        
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                image_hash TEXT,
+                prompt TEXT NOT NULL,
+                model TEXT NOT NULL,
+                text TEXT,
+                error TEXT,
+                seconds REAL,
+                created REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS analyses_path ON analyses (path, created)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS analyses_image_hash ON analyses (image_hash)")
+        
+        # External-content FTS5 index over the analyses table, kept in sync by triggers
+        has_index = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'analyses_fts'"
+        ).fetchone()
+        self.conn.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS analyses_fts USING fts5(
+                text, prompt, path, content='analyses', content_rowid='id', tokenize='porter unicode61'
+            );
+            CREATE TRIGGER IF NOT EXISTS analyses_fts_insert AFTER INSERT ON analyses BEGIN
+                INSERT INTO analyses_fts (rowid, text, prompt, path) VALUES (new.id, new.text, new.prompt, new.path);
+            END;
+            CREATE TRIGGER IF NOT EXISTS analyses_fts_delete AFTER DELETE ON analyses BEGIN
+                INSERT INTO analyses_fts (analyses_fts, rowid, text, prompt, path)
+                VALUES ('delete', old.id, old.text, old.prompt, old.path);
+            END;
+        """)
+        if not has_index:
+            # Index results stored before the full-text index existed
+            self.conn.execute("INSERT INTO analyses_fts (analyses_fts) VALUES ('rebuild')")
+        self.conn.commit()
+    
+    def add(self, path, prompt, model, text, error=None, seconds=None, image_hash=None):
+        """
+        Store one analysis, replacing an earlier one of the same file contents, prompt and model.
+        
+        Args:
+            path: Path of the analyzed image
+            prompt: Prompt sent with the image
+            model: Model name
+            text: Analysis text (None if the analysis failed)
+            error: Error message of a failed analysis
+            seconds: Time the analysis took
+            image_hash: SHA-256 of the image contents (computed from the file if not given)
+        
+        Returns:
+            Row id of the stored analysis
+        """
+        path = os.path.abspath(path)
+        if image_hash is None:
+            try:
+                image_hash = file_hash(path)
+            except OSError:
+                pass
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM analyses WHERE path = ? AND image_hash IS ? AND prompt = ? AND model = ?",
+                (path, image_hash, prompt, model),
+            )
+            cursor = self.conn.execute(
+                "INSERT INTO analyses (path, image_hash, prompt, model, text, error, seconds, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, image_hash, prompt, model, text, error, seconds, time.time()),
+            )
+            self.conn.commit()
+            return cursor.lastrowid
+    
+    def search(self, query, limit=50):
+        """
+        Full-text search of stored analyses, best matches first.
+        
+        Args:
+            query: FTS5 query; plain text that isn't valid FTS5 syntax is searched term by term
+            limit: Maximum number of results
+        
+        Returns:
+            List of result dicts (the stored columns plus a 'snippet' with matches in [brackets])
+        """
+        sql = (
+            "SELECT analyses.*, snippet(analyses_fts, 0, '[', ']', '…', 16) AS snippet "
+            "FROM analyses_fts JOIN analyses ON analyses.id = analyses_fts.rowid "
+            "WHERE analyses_fts MATCH ? ORDER BY rank LIMIT ?"
+        )
+        with self.lock:
+            try:
+                rows = self.conn.execute(sql, (query, limit)).fetchall()
+            except sqlite3.OperationalError:
+                quoted = _quote_terms(query)
+                if not quoted:
+                    return []
+                rows = self.conn.execute(sql, (quoted, limit)).fetchall()
+        return [dict(row) for row in rows]
+    
+    def recent(self, limit=50):
+        """The most recently stored analyses."""
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(
+                "SELECT *, substr(coalesce(text, error), 1, 200) AS snippet FROM analyses "
+                "ORDER BY created DESC LIMIT ?", (limit,)
+            )]
+    
+    def for_path(self, path):
+        """All stored analyses of an image path, newest first."""
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(
+                "SELECT * FROM analyses WHERE path = ? ORDER BY created DESC", (os.path.abspath(path),)
+            )]
+    
+    def has_result(self, image_hash, prompt, model):
+        """Whether a successful analysis of this image content, prompt and model is stored."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM analyses WHERE image_hash = ? AND prompt = ? AND model = ? AND text IS NOT NULL "
+                "LIMIT 1",
+                (image_hash, prompt, model),
+            ).fetchone()
+            return row is not None
+    
+    def count(self):
+        """Number of stored analyses."""
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def format_result(result):
+    """Multi-line, human-readable description of a stored result."""
+    created = datetime.fromtimestamp(result['created']).strftime('%Y-%m-%d %H:%M')
+    seconds = f", {result['seconds']:.1f}s" if result['seconds'] is not None else ""
+    snippet = ' '.join((result.get('snippet') or result['text'] or result['error'] or '').split())
+    return (f"{result['path']}\n"
+            f"  {created}, {result['model']}{seconds} - prompt: {result['prompt']}\n"
+            f"  {snippet}")
+
+
+def main():
+    """Show store statistics, or search stored results."""
+    args = sys.argv[1:]
+    limit = 20
+    as_json = '--json' in args
+    db_path = None
+    terms = []
+    i = 0
+    while i < len(args):
+        value = args[i + 1] if i + 1 < len(args) else None
+        if args[i] in ('-n', '--limit') and value:
+            limit = int(value)
+            i += 2
+        elif args[i] == '--db' and value:
+            db_path = value
+            i += 2
+        elif args[i] in ('-h', '--help'):
+            print("Usage: python results_store.py [query] [options]")
+            print("\nOptions:")
+            print("  -n, --limit N   Maximum number of results (default: 20)")
+            print("  --json          Print results as JSON lines")
+            print("  --db FILE       Results store (default: ~/.image_analyzer/results.sqlite3)")
+            print("\nExamples:")
+            print("  python results_store.py")
+            print("  python results_store.py 'red car' -n 5")
+            print("  python results_store.py '\"golden retriever\" OR labrador'")
+            return
+        else:
+            if not args[i].startswith('--'):
+                terms.append(args[i])
+            i += 1
+    
+    store = ResultsStore(db_path)
+    if not terms:
+        size = os.path.getsize(store.path) if os.path.exists(store.path) else 0
+        print(f"Results store: {store.path}")
+        print(f"  {store.count()} analyses, {size / 1024:.0f} KB on disk")
+        return
+    
+    query = ' '.join(terms)
+    started = time.perf_counter()
+    results = store.search(query, limit)
+    elapsed = (time.perf_counter() - started) * 1000
+    if as_json:
+        for result in results:
+            print(json.dumps(result, ensure_ascii=False))
+        return
+    for result in results:
+        print(format_result(result))
+        print()
+    print(f"{len(results)} result{'s' if len(results) != 1 else ''} for {query!r} in {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
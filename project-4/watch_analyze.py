@@ -0,0 +1,304 @@
+"""
+Watch mode for the image analyzer.
+
+Watches one or more directories (recursively) and analyzes images as soon as
+they are created, modified or moved in. Change notifications come from the
+operating system through watchdog (inotify on Linux, FSEvents on macOS,
+ReadDirectoryChangesW on Windows), so nothing is polled and an idle watcher
+uses no CPU.
+
+A file is only queued once it has been quiet for the debounce interval and its
+size and modification time no longer change, so images that are still being
+copied aren't analyzed half-written. Queued images go through a bounded queue
+to a fixed number of analysis workers, and every result is written to the
+results store (see results_store).
+
+Usage:
+    python watch_analyze.py <directory> [more directories] [options]
+"""
+
+import os
+import queue
+import sys
+import threading
+import time
+
+from batch_analyze import DEFAULT_PROMPT, IMAGE_EXTENSIONS, QuotaRateLimiter, analyze_with_retry
+from image_analyzer import MODEL_NAME
+from result_cache import file_hash
+from results_store import ResultsStore
+
+
+def is_image(path):
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+
+def _stat_signature(path):
+    """(size, mtime) of a file, or None if it is gone."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class Debouncer:
+    """
+    Collects change notifications and releases each file once it has settled.
+    
+    A file is released after `delay` seconds without new events, provided its
+    size and mtime are unchanged since the last event. The release thread
+    sleeps until the next deadline (or indefinitely when nothing is pending).
+    """
+    
+    def __init__(self, delay, release):
+        """
+        Args:
+            delay: Seconds a file must stay unchanged before it is released
+            release: Called as release(path, first_seen) from the debouncer thread;
+                     may block (e.g. on a full queue)
+        """
+        self.delay = delay
+        self.release = release
+        self.pending = {}  # path -> [deadline, first_seen, stat signature]
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    
+    def touch(self, path):
+        """Record a change to path, pushing back its release."""
+        now = time.monotonic()
+        with self.condition:
+            entry = self.pending.get(path)
+            if entry:
+                entry[0] = now + self.delay
+                entry[2] = _stat_signature(path)
+            else:
+                self.pending[path] = [now + self.delay, time.time(), _stat_signature(path)]
+            self.condition.notify()
+    
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.stopped:
+                    now = time.monotonic()
+                    due = [path for path, entry in self.pending.items() if entry[0] <= now]
+                    if due:
+                        break
+                    timeout = min((entry[0] for entry in self.pending.values()), default=now) - now
+                    self.condition.wait(timeout if self.pending else None)
+                if self.stopped:
+                    return
+                ready = []
+                for path in due:
+                    entry = self.pending[path]
+                    signature = _stat_signature(path)
+                    if signature is None:
+                        del self.pending[path]  # Deleted or moved away again
+                    elif signature != entry[2]:
+                        # Still being written without new events: check again later
+                        entry[0] = now + self.delay
+                        entry[2] = signature
+                    else:
+                        del self.pending[path]
+                        ready.append((path, entry[1]))
+            # Released outside the lock, so events keep being collected while the queue is full
+            for path, first_seen in ready:
+                self.release(path, first_seen)
+    
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+
+def _make_event_handler(debouncer):
+    """watchdog event handler that feeds image file events to the debouncer."""
+    from watchdog.events import FileSystemEventHandler
+    
+    class ImageEventHandler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            if event.is_directory or event.event_type in ('deleted', 'opened', 'closed_no_write'):
+                return
+            # For moves, the destination is the file that appeared
+            path = os.fsdecode(getattr(event, 'dest_path', '') or event.src_path)
+            if is_image(path):
+                debouncer.touch(os.path.abspath(path))
+    
+    return ImageEventHandler()
+
+
+def iter_existing(directories):
+    """Yield the images already present in the watched directories."""
+    for directory in directories:
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if is_image(filename):
+                    yield os.path.abspath(os.path.join(dirpath, filename))
+
+
+def watch(directories, prompt=DEFAULT_PROMPT, workers=4, requests_per_minute=60, retries=5, queue_size=100,
+          debounce=1.0, store=None, existing=False, stop_event=None):
+    """
+    Analyze images as they appear in directories until interrupted.
+    
+    Args:
+        directories: Directories to watch (recursively)
+        prompt: Prompt sent with every image
+        workers: Number of analysis workers
+        requests_per_minute: Request quota shared by all workers
+        retries: Retries per image for quota and transient errors
+        queue_size: Maximum number of settled images waiting for a worker
+        debounce: Seconds a file must stay unchanged before it is analyzed
+        store: ResultsStore to write results to (default: the default store)
+        existing: Also analyze images already in the directories that have no stored result
+        stop_event: threading.Event that ends the watch when set (default: run until Ctrl+C)
+    
+    Returns:
+        Dict with counts of analyzed and failed images
+    """
+    try:
+        from watchdog.observers import Observer
+    except ImportError:
+        print("Error: watch mode needs watchdog: pip install watchdog")
+        sys.exit(1)
+    
+    store = store or ResultsStore()
+    limiter = QuotaRateLimiter(requests_per_minute)
+    jobs = queue.Queue(maxsize=queue_size)
+    stats = {'analyzed': 0, 'failed': 0}
+    stats_lock = threading.Lock()
+    
+    def work():
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            path, first_seen = job
+            result = analyze_with_retry(path, prompt, limiter, retries)
+            store.add(path, prompt, MODEL_NAME, result['text'], result['error'], result['seconds'])
+            latency = time.time() - first_seen
+            with stats_lock:
+                stats['analyzed' if result['text'] is not None else 'failed'] += 1
+            if result['error']:
+                print(f"  Failed: {path}: {result['error']}")
+            else:
+                print(f"  Stored {path} ({latency:.1f}s after it changed, {result['seconds']:.1f}s analysis)")
+    
+    debouncer = Debouncer(debounce, lambda path, first_seen: jobs.put((path, first_seen)))
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    
+    observer = Observer()
+    handler = _make_event_handler(debouncer)
+    for directory in directories:
+        observer.schedule(handler, directory, recursive=True)
+    observer.start()
+    
+    if existing:
+        # Queued after the observer started, so nothing added meanwhile is missed
+        for path in iter_existing(directories):
+            try:
+                if not store.has_result(file_hash(path), prompt, MODEL_NAME):
+                    jobs.put((path, time.time()))
+            except OSError:
+                pass
+    
+    print(f"Watching {', '.join(directories)} ({workers} workers, {requests_per_minute:g} requests/minute). "
+          f"Press Ctrl+C to stop.")
+    try:
+        if stop_event:
+            stop_event.wait()
+        else:
+            while observer.is_alive():
+                observer.join(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        observer.stop()
+        observer.join()
+        debouncer.stop()
+        for _ in threads:
+            jobs.put(None)
+        for thread in threads:
+            thread.join()
+    
+    print(f"\nStopped: {stats['analyzed']} analyzed, {stats['failed']} failed "
+          f"({store.count()} results in {store.path})")
+    return stats
+
+
+def main():
+    """Command-line entry point for watch mode."""
+    if len(sys.argv) < 2:
+        print("Usage: python watch_analyze.py <directory> [more directories] [options]")
+        print("\nOptions:")
+        print("  -p, --prompt TEXT   Prompt sent with every image")
+        print("  -w, --workers N     Concurrent analyses (default: 4)")
+        print("  --rpm N             Requests per minute quota (default: 60)")
+        print("  --retries N         Retries for quota/transient errors (default: 5)")
+        print("  --queue N           Maximum images waiting for a worker (default: 100)")
+        print("  --debounce S        Seconds a file must stay unchanged before analysis (default: 1.0)")
+        print("  --db FILE           Results store (default: ~/.image_analyzer/results.sqlite3)")
+        print("  --existing          Also analyze images already in the directories")
+        print("\nExample:")
+        print("  python watch_analyze.py /shared/incoming --workers 8 --rpm 300")
+        sys.exit(1)
+    
+    directories = []
+    prompt = DEFAULT_PROMPT
+    workers = 4
+    rpm = 60.0
+    retries = 5
+    queue_size = 100
+    debounce = 1.0
+    db_path = None
+    existing = '--existing' in sys.argv
+    
+    i = 1
+    while i < len(sys.argv):
+        arg = sys.argv[i]
+        value = sys.argv[i + 1] if i + 1 < len(sys.argv) else None
+        if arg in ('-p', '--prompt') and value:
+            prompt = value
+            i += 2
+        elif arg in ('-w', '--workers') and value:
+            workers = int(value)
+            i += 2
+        elif arg == '--rpm' and value:
+            rpm = float(value)
+            i += 2
+        elif arg == '--retries' and value:
+            retries = int(value)
+            i += 2
+        elif arg == '--queue' and value:
+            queue_size = int(value)
+            i += 2
+        elif arg == '--debounce' and value:
+            debounce = float(value)
+            i += 2
+        elif arg == '--db' and value:
+            db_path = value
+            i += 2
+        elif not arg.startswith('-'):
+            directories.append(arg)
+            i += 1
+        else:
+            i += 1
+    
+    for directory in directories:
+        if not os.path.isdir(directory):
+            print(f"Error: {directory} is not a directory")
+            sys.exit(1)
+    if not directories:
+        print("Error: no directory to watch")
+        sys.exit(1)
+    
+    watch(directories, prompt, workers, rpm, retries, queue_size, debounce, ResultsStore(db_path), existing)
+
+
+if __name__ == "__main__":
+    main()